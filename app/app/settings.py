@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
 import os
+import sys
+
+from core.backends import connection_options
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -43,15 +46,30 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its total covers the other middleware too
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Server-Timing headers and the slow request log, see core.timing. Only a
+# SAMPLE_RATE share of requests is timed. Timed requests slower than
+# SLOW_MS are logged with the TOP_QUERIES statements that took longest
+SERVER_TIMING = {
+    'SAMPLE_RATE': float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0.1)),
+    'SLOW_MS': int(os.environ.get('SLOW_REQUEST_MS', 500)),
+    'TOP_QUERIES': 5,
+    # the header shows clients how long queries took, turn it off to only
+    # keep the log
+    'HEADER': os.environ.get('SERVER_TIMING_HEADER', '1') == '1',
+}
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -75,16 +93,63 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# DB_CONN_MODE is per-request, persistent (the default, connections live
+# DB_CONN_MAX_AGE seconds) or pgbouncer (DB_HOST/DB_PORT point at PgBouncer
+# in transaction pooling mode), see core.backends.connection_options
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        **connection_options(
+            os.environ.get('DB_CONN_MODE', 'persistent'),
+            int(os.environ.get('DB_CONN_MAX_AGE', 600))),
     }
 }
 
+# Read replicas, DB_REPLICA_HOSTS is a comma separated list of hosts with
+# the credentials of the primary. Tests run them as mirrors of default
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+
+# Shards, DB_SHARD_HOSTS is a comma separated list of hosts with the
+# credentials of the primary. The recipes, tags and ingredients of a user
+# live on one of SHARDS, picked by a hash of the user id unless a
+# core.models.ShardAssignment row says otherwise (see core.sharding and the
+# move_user_shard command). Every shard hands out ids from its own range of
+# ID_SPAN, so rows keep their ids when they move. Lookups of the assignment
+# table are cached for DIRECTORY_TTL seconds
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(',')), 1):
+    DATABASES[f'shard{index}'] = dict(DATABASES['default'], HOST=host.strip())
+
+DATABASE_SHARDS = {
+    'SHARDS': [alias for alias in DATABASES
+               if alias == 'default' or alias.startswith('shard')],
+    'ID_SPAN': 100_000_000,
+    'DIRECTORY_TTL': 30,
+}
+
+# Safe requests to views with core.routers.ReplicaReadMixin read from one of
+# REPLICAS. A user who wrote reads from the primary for PIN_SECONDS, longer
+# than the replication lag. Pins are kept in BACKEND, see
+# RECIPE_RESPONSE_CACHE, use the redis one with several app servers
+DATABASE_ROUTERS = ['core.routers.ShardRouter', 'core.routers.ReplicaRouter']
+DATABASE_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES
+                 if alias.startswith('replica')],
+    'PIN_SECONDS': int(os.environ.get('DB_PIN_SECONDS', 5)),
+    'BACKEND': os.environ.get(
+        'DB_PIN_BACKEND', 'recipe.cache.LocMemBackend'),
+    'LOCATION': os.environ.get('DB_PIN_URL', ''),
+    'KEY_PREFIX': 'db-pin',
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
 
@@ -107,6 +172,37 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PASSWORD_HASHER_PROFILE picks the hashers, the first one hashes new and
+# rehashes outdated passwords on login. 'fast' hashes with MD5 and is only
+# meant for tests and seeded data, it is the default of manage.py test.
+PASSWORD_HASHER_PROFILES = {
+    'default': [
+        'core.hashing.ConfiguredPBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    ],
+}
+PASSWORD_HASHER_PROFILES['fast'] = [
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+] + PASSWORD_HASHER_PROFILES['default']
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[os.environ.get(
+    'PASSWORD_HASHER_PROFILE', 'fast' if sys.argv[1:2] == ['test'] else
+    'default')]
+
+# Password checks and hashing (core.hashing) run in a pool of WORKERS
+# threads per process, 0 runs them in the request thread. Once WORKERS +
+# MAX_QUEUE are busy further logins get a 429 right away. ITERATIONS is the
+# PBKDF2 cost, stored passwords are rehashed on login when it changes.
+PASSWORD_HASHING = {
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', 2)),
+    'MAX_QUEUE': int(os.environ.get('PASSWORD_HASHING_MAX_QUEUE', 16)),
+    'TIMEOUT': 10,
+    'ITERATIONS': int(os.environ.get('PASSWORD_HASH_ITERATIONS', 150000)),
+}
+
+AUTHENTICATION_BACKENDS = ['user.backends.PooledModelBackend']
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.1/topics/i18n/
 
@@ -131,4 +227,76 @@ STATIC_ROOT = '/vol/web/static'
 # collect stastic will put it into static root or static directory
 # when in production that is where it will live
 
-AUTH_USER_MODEL = 'core.User'
\ No newline at end of file
+AUTH_USER_MODEL = 'core.User'
+
+# Cache of recipe, tag and ingredient API responses (recipe.cache)
+# BACKEND is recipe.cache.LocMemBackend (per process) or
+# recipe.cache.RedisBackend (shared, LOCATION is a redis:// url, needs the
+# redis package installed). Writes invalidate the responses in the
+# configured backend only; with the per process LocMemBackend other
+# processes keep serving stale responses for up to TIMEOUT seconds, so it
+# defaults to a few seconds there. Use the redis one with several workers
+_RECIPE_CACHE_BACKEND = os.environ.get(
+    'RECIPE_CACHE_BACKEND', 'recipe.cache.LocMemBackend')
+RECIPE_RESPONSE_CACHE = {
+    'BACKEND': _RECIPE_CACHE_BACKEND,
+    'LOCATION': os.environ.get('RECIPE_CACHE_URL', ''),
+    'TIMEOUT': int(os.environ.get(
+        'RECIPE_CACHE_TIMEOUT',
+        5 if _RECIPE_CACHE_BACKEND == 'recipe.cache.LocMemBackend' else 300)),
+    'MAX_ENTRIES': 10000,
+    'MAX_BYTES': 64 * 1024 * 1024,
+}
+
+# Cache of the user each API token belongs to (user.authentication), saves
+# the token and user query of every authenticated request. Takes the same
+# backends as RECIPE_RESPONSE_CACHE. Changes to a token or user clear its
+# entry in the configured backend; with the per process LocMemBackend other
+# processes can still accept a revoked token for up to TIMEOUT seconds.
+TOKEN_AUTH_CACHE = {
+    'BACKEND': os.environ.get(
+        'TOKEN_CACHE_BACKEND', 'recipe.cache.LocMemBackend'),
+    'LOCATION': os.environ.get('TOKEN_CACHE_URL', ''),
+    'KEY_PREFIX': 'token-auth',
+    'TIMEOUT': 60,
+    'MAX_ENTRIES': 10000,
+}
+
+# Lifetime of API tokens (core.models.Token) in seconds. A token expires
+# once unused for IDLE or older than MAX_AGE, whichever comes first. Its
+# last use is written at most once per REFRESH_INTERVAL. Run purge_tokens
+# regularly to delete expired tokens.
+TOKEN_EXPIRY = {
+    'IDLE': 14 * 24 * 60 * 60,
+    'MAX_AGE': 90 * 24 * 60 * 60,
+    'REFRESH_INTERVAL': 5 * 60,
+}
+
+# Downscaled copies of uploaded recipe images (recipe.thumbnails), stored
+# next to the original as <name>__<size>.<ext>. SIZES maps each size to its
+# longest edge in pixels, FORMAT is WEBP or JPEG. WORKERS processes render
+# them in the background, 0 renders them during the upload request.
+RECIPE_IMAGE_DERIVATIVES = {
+    'SIZES': {'thumbnail': 160, 'medium': 640, 'large': 1280},
+    'FORMAT': 'WEBP',
+    'QUALITY': 80,
+    'WORKERS': int(os.environ.get('RECIPE_IMAGE_WORKERS', 2)),
+}
+
+# Limits of recipe image uploads (recipe.uploads), checked while the upload
+# streams in so oversized or non image payloads are dropped early
+RECIPE_IMAGE_UPLOAD = {
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'MAX_PIXELS': 50 * 1000 * 1000,
+}
+
+# Delivery of MEDIA_URL by recipe.media.MediaView. SENDFILE_HEADER is empty
+# to stream files from Python, X-Accel-Redirect to let nginx send them from
+# an internal location at ACCEL_PREFIX aliased to MEDIA_ROOT, or X-Sendfile
+# for Apache and lighttpd. File names never change content so MAX_AGE can
+# be as long as browsers allow.
+MEDIA_DELIVERY = {
+    'SENDFILE_HEADER': os.environ.get('MEDIA_SENDFILE_HEADER', ''),
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_AGE': 365 * 24 * 60 * 60,
+}
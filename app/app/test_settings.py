@@ -0,0 +1,27 @@
+"""Settings to run the tests without Postgres, on SQLite databases standing
+in for the primary, a read replica and a second shard
+
+    python manage.py test --settings=app.test_settings
+"""
+import tempfile
+
+from app.settings import *  # noqa
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),  # noqa
+    },
+    # not replicated, tests write to it directly to tell the two apart
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),  # noqa
+    },
+    # only a shard in the tests that add it to DATABASE_SHARDS
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'shard1.sqlite3'),  # noqa
+    },
+}
+
+MEDIA_ROOT = tempfile.mkdtemp()
@@ -13,16 +13,26 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
-from django.conf.urls.static import static
+from django.urls import path, include, re_path
 from django.conf import settings
 
+from core import health
+from recipe.media import MediaView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # any request that starts with api/user/ points to user.urls (user > urls.py)
     path('api/user/', include('user.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(
-    settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    # what the static settings.MEDIA_URL does is that it let's media url avail in development server
+    # probes of the orchestrator, ready once every database answers
+    path('health/live/', health.live, name='health-live'),
+    path('health/ready/', health.ready, name='health-ready'),
+    # checks the user may see the file, then streams it or hands it to the
+    # front end server (see MEDIA_DELIVERY)
+    re_path(r'^{}(?P<name>.+)$'.format(
+        re.escape(settings.MEDIA_URL.lstrip('/'))),
+        MediaView.as_view(), name='media'),
+]
@@ -0,0 +1,34 @@
+from django.core.exceptions import ImproperlyConfigured
+
+
+def connection_options(mode, max_age=600):
+    """Return the DATABASES entries of a connection mode
+
+    per-request  opens a connection for every request, like Django's
+                 default
+    persistent   keeps connections for max_age seconds and checks one that
+                 sat idle before a request uses it
+    pgbouncer    persistent connections to PgBouncer in transaction pooling
+                 mode, where consecutive transactions may run on different
+                 servers, so nothing may outlive a transaction
+    """
+    if mode == 'per-request':
+        return {'CONN_MAX_AGE': 0}
+    if mode == 'persistent':
+        return {'CONN_MAX_AGE': max_age, 'CONN_HEALTH_CHECKS': True}
+    if mode == 'pgbouncer':
+        # named cursors (QuerySet.iterator()) live until the transaction
+        # ends on one server. psycopg2 never prepares statements, so there
+        # is nothing else to turn off. The servers should run in UTC,
+        # otherwise Django sets the time zone per connection and PgBouncer
+        # sets it again on every server switch; the backend warns about
+        # them (see core.backends.mixins.ServerTimeZoneMixin)
+        return {
+            'CONN_MAX_AGE': max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': True,
+            'CHECK_SERVER_TIME_ZONE': True,
+        }
+    raise ImproperlyConfigured(
+        f'Unknown DB_CONN_MODE {mode!r}, use per-request, persistent or '
+        'pgbouncer')
@@ -0,0 +1,51 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HealthCheckMixin:
+    """Check a persistent connection before the first query of a request
+
+    Django 2.2 only tests a connection after an error, so one the server
+    or a proxy dropped while idle fails the next request. With
+    CONN_HEALTH_CHECKS set, the first use after each request boundary runs
+    is_usable() (SELECT 1 on Postgres) and reconnects if it fails.
+    """
+    health_check_pending = False
+
+    def close_if_unusable_or_obsolete(self):
+        # runs when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_pending = self.connection is not None
+
+    def ensure_connection(self):
+        if self.health_check_pending and not self.in_atomic_block and \
+                self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            self.health_check_pending = False
+            if self.connection is not None and not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+
+class ServerTimeZoneMixin:
+    """Warn about a server whose time zone is not the connection's
+
+    Django then switches every new connection with SET TIME ZONE. PgBouncer
+    tracks TimeZone per client and sets it again on each server it hands
+    out, which works but costs a statement on most transactions. Checked
+    with CHECK_SERVER_TIME_ZONE once per connection, the server reports
+    its time zone when the connection opens.
+    """
+
+    def init_connection_state(self):
+        if self.settings_dict.get('CHECK_SERVER_TIME_ZONE'):
+            # the comparison Django's ensure_timezone() makes
+            actual = self.server_time_zone()
+            if self.timezone_name and actual != self.timezone_name:
+                logger.warning(
+                    'Database %s runs in time zone %s, set its timezone to '
+                    '%s', self.alias, actual, self.timezone_name)
+        super().init_connection_state()
+
+    def server_time_zone(self):
+        return self.connection.get_parameter_status('TimeZone')
@@ -0,0 +1,9 @@
+from django.db.backends.postgresql import base
+
+from core.backends.mixins import HealthCheckMixin, ServerTimeZoneMixin
+
+
+class DatabaseWrapper(HealthCheckMixin, ServerTimeZoneMixin,
+                      base.DatabaseWrapper):
+    """The postgresql backend, with health checks of persistent
+    connections and an optional check of the server time zone"""
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache bounded by entries and bytes"""
+
+    def __init__(self, max_entries=1000, max_bytes=None, timeout=None):
+        self.max_entries = max_entries
+        # only values that have a length (bytes, str) count towards max_bytes
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value for key and mark it as recently used"""
+        with self._lock:
+            try:
+                value, size, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                self._discard(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value under key, evicting the least recently used entries"""
+        timeout = self.timeout if timeout is None else timeout
+        expires = None if timeout is None else time.monotonic() + timeout
+        size = len(value) if self.max_bytes and hasattr(value, '__len__') \
+            else 0
+        if self.max_bytes and size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        with self._lock:
+            self._discard(key)
+            self._data[key] = (value, size, expires)
+            self._size += size
+            while len(self._data) > self.max_entries or \
+                    (self.max_bytes and self._size > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove key from the cache if it is there"""
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def stats(self):
+        """Return the hit, miss and eviction counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'bytes': self._size,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+    def _discard(self, key):
+        """Remove key, the caller must hold the lock"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from core.models import normalize_name
+from core.search import update_search_vectors
+
+
+def normalize_names(model, through, column, batch_size=1000,
+                    using='default', on_change=None):
+    """Normalize the stored names of tags or ingredients
+
+    A row whose normalized name the user already has is merged into that
+    row instead of renamed, so this also works once names are unique.
+    update() sends no signals, so the recipes using a changed row are
+    bumped and their search documents rebuilt here, and on_change is
+    called with the ids of their users. Returns the number of rows renamed
+    or merged away.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        rows = list(model.objects.using(using).filter(pk__gt=last_id)
+                    .order_by('pk')
+                    .values_list('pk', 'user_id', 'name')[:batch_size])
+        if not rows:
+            return fixed
+        last_id = rows[-1][0]
+        users = set()
+        with transaction.atomic(using=using):
+            renamed = []
+            for pk, user_id, name in rows:
+                if name == normalize_name(name):
+                    continue
+                keep = model.objects.using(using) \
+                    .filter(user_id=user_id, name=normalize_name(name)) \
+                    .values_list('pk', flat=True).first()
+                if keep is None:
+                    model.objects.using(using).filter(pk=pk) \
+                        .update(name=normalize_name(name))
+                    renamed.append(pk)
+                else:
+                    _merge_into(model, through, column, keep, [pk], using)
+                users.add(user_id)
+                fixed += 1
+            _touch_recipes(through, through.objects.using(using)
+                           .filter(**{f'{column}__in': renamed})
+                           .values_list('recipe_id', flat=True), using)
+        if on_change is not None and users:
+            on_change(users)
+
+
+def count_duplicates(model, using='default'):
+    """Return how many rows merge_duplicates would remove"""
+    groups = model.objects.using(using).values('user_id', 'name') \
+        .annotate(rows=Count('id')).filter(rows__gt=1).order_by()
+    return sum(group['rows'] - 1 for group in groups)
+
+
+def merge_duplicates(model, through, column, batch_size=100,
+                     using='default', on_change=None):
+    """Merge tags or ingredients sharing a user and name
+
+    The oldest row of each group is kept, the recipes of the others are
+    linked to it instead and the others are deleted. Runs one transaction
+    per batch_size groups so no lock is held for long, then calls
+    on_change with the ids of the users it changed. Returns the number of
+    rows merged away.
+    """
+    merged = 0
+    while True:
+        groups = list(
+            model.objects.using(using).values('user_id', 'name')
+            .annotate(rows=Count('id'), keep=Min('id'))
+            .filter(rows__gt=1).order_by()[:batch_size])
+        if not groups:
+            return merged
+
+        with transaction.atomic(using=using):
+            for group in groups:
+                merged += _merge_group(model, through, column, group, using)
+        if on_change is not None:
+            on_change({group['user_id'] for group in groups})
+
+
+def _merge_group(model, through, column, group, using):
+    """Merge one group of duplicates into its oldest row"""
+    duplicates = list(
+        model.objects.using(using)
+        .filter(user_id=group['user_id'], name=group['name'])
+        .exclude(pk=group['keep']).values_list('pk', flat=True))
+    _merge_into(model, through, column, group['keep'], duplicates, using)
+    return len(duplicates)
+
+
+def _merge_into(model, through, column, keep, duplicates, using):
+    """Link the recipes of the duplicates to keep and delete them"""
+    links = through.objects.using(using)
+    linked = set(links.filter(**{column: keep})
+                 .values_list('recipe_id', flat=True))
+    # a recipe linked to several duplicates only gets one row for the keeper
+    touched = set(links.filter(**{f'{column}__in': duplicates})
+                  .values_list('recipe_id', flat=True))
+    links.filter(**{f'{column}__in': duplicates}).delete()
+    links.bulk_create(
+        through(recipe_id=recipe_id, **{column: keep})
+        for recipe_id in sorted(touched - linked))
+
+    # the recipes now list another id
+    _touch_recipes(through, touched, using)
+
+    model.objects.using(using).filter(pk__in=duplicates).delete()
+
+
+def _touch_recipes(through, recipe_ids, using):
+    """Bump the recipes whose tags or ingredients changed, so conditional
+    GETs see the change, and rebuild their search documents"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    recipe_model = through._meta.get_field('recipe').related_model
+    recipe_model.objects.using(using).filter(pk__in=recipe_ids) \
+        .update(updated_at=timezone.now())
+    update_search_vectors(recipe_ids, using)
@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class SearchVectorField(models.Field):
+    """Stored full-text search document of a row
+
+    A tsvector column on Postgres (queried through its GIN index), plain
+    text of lowercased words on every other database so the test suite
+    can run without Postgres. Maintained by core.search.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'tsvector'
+        return 'text'
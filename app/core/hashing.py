@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, \
+    check_password, make_password
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import Throttled
+
+
+class ConfiguredPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with the cost set by PASSWORD_HASHING['ITERATIONS']
+
+    Keeps the algorithm name, so hashes of the stock hasher still verify
+    and are rehashed at the configured cost on the next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING.get(
+            'ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class HashingUnavailable(Throttled):
+    default_detail = _('Too many logins at once, try again shortly.')
+
+
+class HashingPool:
+    """Threads hashing passwords, at most workers + max_queue jobs at once
+
+    PBKDF2 releases the GIL, so a few threads keep the CPUs busy while
+    requests beyond the queue fail fast with a 429 instead of piling up.
+    """
+
+    def __init__(self, workers, max_queue=0, timeout=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing')
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.timeout = timeout
+
+    def run(self, func, *args):
+        """Return func(*args) computed in the pool"""
+        if not self.slots.acquire(blocking=False):
+            raise HashingUnavailable(wait=1)
+        try:
+            future = self.executor.submit(func, *args)
+        except RuntimeError:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            raise HashingUnavailable(wait=1)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_pool = None
+
+
+def get_hashing_pool():
+    """Return the pool of PASSWORD_HASHING, None to hash inline"""
+    global _pool
+    options = settings.PASSWORD_HASHING
+    if _pool is None and options.get('WORKERS'):
+        _pool = HashingPool(
+            options['WORKERS'], options.get('MAX_QUEUE', 0),
+            options.get('TIMEOUT'))
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    """Pick up the pool size when tests override it"""
+    global _pool
+    if setting == 'PASSWORD_HASHING' and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def run_hashing(func, *args):
+    pool = get_hashing_pool()
+    return func(*args) if pool is None else pool.run(func, *args)
+
+
+def hash_password(raw_password):
+    """Return make_password(raw_password), computed in the pool"""
+    return run_hashing(make_password, raw_password)
+
+
+def _check(raw_password, encoded):
+    outdated = []
+    valid = check_password(raw_password, encoded, setter=outdated.append)
+    return valid, bool(outdated)
+
+
+def verify_password(raw_password, encoded):
+    """Return whether the password matches and whether its hash uses an
+    outdated algorithm or cost, checked in the pool"""
+    return run_hashing(_check, raw_password, encoded)
@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.db import connections
+from django.http import JsonResponse
+
+
+def probe_database(alias):
+    """Connect to the database alias and run SELECT 1
+
+    Returns None when it answered, else the error message.
+    """
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    except Exception as error:
+        return f'{type(error).__name__}: {error}'.strip()
+    finally:
+        # probes run in their own threads, their connections must not leak
+        connection.close()
+    return None
+
+
+def check_databases(aliases=None, timeout=5):
+    """Probe every database alias at once
+
+    Returns {alias: error or None}, a probe still running after timeout
+    seconds counts as failed.
+    """
+    aliases = list(aliases or connections)
+    executor = ThreadPoolExecutor(max_workers=len(aliases))
+    futures = {alias: executor.submit(probe_database, alias)
+               for alias in aliases}
+    wait(futures.values(), timeout=timeout)
+    # a hanging connect keeps its thread, do not wait for it
+    executor.shutdown(wait=False)
+    return {
+        alias: future.result() if future.done()
+        else f'no answer within {timeout}s'
+        for alias, future in futures.items()
+    }
+
+
+def live(request):
+    """Liveness, the process answers requests"""
+    return JsonResponse({'status': 'ok'})
+
+
+def ready(request):
+    """Readiness, every configured database answers"""
+    start = time.monotonic()
+    errors = check_databases(timeout=2)
+    ok = not any(errors.values())
+    return JsonResponse({
+        'status': 'ok' if ok else 'unavailable',
+        'databases': {
+            alias: error or 'ok' for alias, error in errors.items()},
+        'duration_ms': round((time.monotonic() - start) * 1000, 1),
+    }, status=200 if ok else 503)
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core import signals
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.backends import connection_options
+
+
+class Command(BaseCommand):
+    """Django command to compare the database connection modes"""
+    help = ('Time requests running one query under each DB_CONN_MODE, '
+            'point the database settings at PgBouncer for its mode')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--modes', nargs='+',
+                            default=['per-request', 'persistent',
+                                     'pgbouncer'])
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        connection = connections[options['database']]
+        original = dict(connection.settings_dict)
+        for mode in options['modes']:
+            connection.close()
+            connection.settings_dict.update(connection_options(mode))
+            try:
+                durations = sorted(self.request(options['database'])
+                                   for _ in range(options['requests']))
+            finally:
+                connection.close()
+                connection.settings_dict.clear()
+                connection.settings_dict.update(original)
+            self.stdout.write(
+                f'{mode:<12} median '
+                f'{statistics.median(durations) * 1000:7.3f}ms '
+                f'p95 {durations[int(len(durations) * .95)] * 1000:7.3f}ms')
+
+    def request(self, alias):
+        """Return the duration of a request making one query"""
+        start = time.perf_counter()
+        # the signals close or keep connections like a real request would
+        signals.request_started.send(sender=self.__class__)
+        get_user_model().objects.using(alias).order_by() \
+            .values_list('pk', flat=True).first()
+        signals.request_finished.send(sender=self.__class__)
+        return time.perf_counter() - start
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.dedupe import count_duplicates, merge_duplicates, normalize_names
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import get_response_cache
+
+
+class Command(BaseCommand):
+    """Django command to merge duplicate tags and ingredients"""
+    help = 'Merge tags and ingredients a user has more than once'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Duplicate groups merged per transaction')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many rows would be merged')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        shards = settings.DATABASE_SHARDS['SHARDS']
+        for using in shards:
+            # a user's rows are all on one shard, so are their duplicates
+            prefix = f'{using}: ' if len(shards) > 1 else ''
+            for model, through, column in (
+                    (Tag, Recipe.tags.through, 'tag_id'),
+                    (Ingredient, Recipe.ingredients.through,
+                     'ingredient_id')):
+                name = model._meta.verbose_name_plural
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'{prefix}{count_duplicates(model, using)} '
+                        f'duplicate {name}')
+                    continue
+
+                fixed = normalize_names(
+                    model, through, column, using=using,
+                    on_change=self.forget_responses)
+                merged = merge_duplicates(
+                    model, through, column,
+                    batch_size=options['batch_size'], using=using,
+                    on_change=self.forget_responses)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{prefix}Normalized {fixed} and merged {merged} '
+                    f'duplicate {name}'))
+
+    def forget_responses(self, user_ids):
+        """Drop the cached responses of users whose rows changed, update()
+        sends no signals"""
+        cache = get_response_cache()
+        for user_id in user_ids:
+            cache.invalidate_user(user_id)
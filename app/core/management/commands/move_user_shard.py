@@ -0,0 +1,139 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core.models import Ingredient, Recipe, ShardAssignment, Tag
+from core.sharding import get_assignment, get_assignments, hashed_shard
+
+
+class Command(BaseCommand):
+    """Django command to move a user's rows to another shard while the
+    app keeps serving requests
+
+    1. the user is frozen, their writes are refused with a 503 while
+       reads keep going to the old shard
+    2. once every process has seen the freeze, the rows are copied to the
+       new shard in one transaction, keeping their ids
+    3. the user is pointed at the new shard and unfrozen
+    4. once every process reads from the new shard, the rows are deleted
+       from the old one
+    """
+    help = 'Move the recipes, tags and ingredients of a user to a shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='Email or id of the user')
+        parser.add_argument('shard', help='Database alias to move to')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows read and inserted per query')
+        parser.add_argument('--no-wait', action='store_true',
+                            help='Do not wait DIRECTORY_TTL for other '
+                                 'processes, only safe with none running')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        shards = settings.DATABASE_SHARDS['SHARDS']
+        target = options['shard']
+        if target not in shards:
+            raise CommandError(f'{target} is not one of {", ".join(shards)}')
+        user = self.get_user(options['user'])
+        source, frozen = get_assignment(user.pk)
+        if frozen:
+            raise CommandError(f'{user.email} is being moved already')
+        if source == target:
+            self.stdout.write(f'{user.email} is on {target} already')
+            return
+        self.batch_size = options['batch_size']
+        self.wait = 0 if options['no_wait'] else \
+            settings.DATABASE_SHARDS['DIRECTORY_TTL']
+
+        self.assign(user.pk, source, frozen=True)
+        try:
+            self.pause(f'Froze {user.email} on {source}')
+            rows = self.copy(user, source, target)
+        except BaseException:
+            self.assign(user.pk, source)
+            raise
+        self.assign(user.pk, target)
+        self.pause(f'Copied {rows} rows to {target}, switched')
+        self.delete(user, source)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {user.email} from {source} to {target}'))
+
+    def get_user(self, value):
+        users = get_user_model().objects
+        user = users.filter(pk=value).first() if value.isdigit() else \
+            users.filter_email(value).first()
+        if user is None:
+            raise CommandError(f'No user {value}')
+        return user
+
+    def assign(self, user_id, alias, frozen=False):
+        """Point the directory at alias, the hash needs no row"""
+        if alias == hashed_shard(user_id) and not frozen:
+            ShardAssignment.objects.using(DEFAULT_DB_ALIAS) \
+                .filter(user_id=user_id).delete()
+        else:
+            ShardAssignment.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+                user_id=user_id, defaults={'alias': alias, 'frozen': frozen})
+        # other processes notice once their cached lookup expires
+        get_assignments().delete(user_id)
+
+    def pause(self, message):
+        self.stdout.write(f'{message}, waiting {self.wait}s')
+        time.sleep(self.wait)
+
+    def copy(self, user, source, target):
+        """Copy the user's rows from source to target, return how many"""
+        copied = 0
+        with transaction.atomic(using=target):
+            # the foreign keys need the user on the target
+            self.delete(user, target)
+            if target != DEFAULT_DB_ALIAS:
+                get_user_model().objects.using(target).create(
+                    pk=user.pk, email=user.email, password='!',
+                    is_active=user.is_active)
+            for model in (Tag, Ingredient, Recipe):
+                copied += self.copy_rows(
+                    model, model._base_manager.using(source)
+                    .filter(user_id=user.pk), target, keep_ids=True)
+            for through in (Recipe.tags.through,
+                            Recipe.ingredients.through):
+                # new ids from the target's sequence, nothing refers to them
+                copied += self.copy_rows(
+                    through, through._base_manager.using(source)
+                    .filter(recipe__user_id=user.pk), target,
+                    keep_ids=False)
+        return copied
+
+    def copy_rows(self, model, queryset, target, keep_ids):
+        fields = [field for field in model._meta.concrete_fields
+                  if keep_ids or not field.primary_key]
+        # SQLite limits the parameters of a statement
+        size = connections[target].ops.bulk_batch_size(
+            fields, [None] * self.batch_size)
+        copied = last_id = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id).order_by('pk')[:size])
+            if not batch:
+                return copied
+            last_id = batch[-1].pk
+            # raw keeps created_at and updated_at as they are, and unlike
+            # bulk_create nothing is counted again (image references)
+            model._base_manager._insert(
+                batch, fields=fields, using=target, raw=True)
+            copied += len(batch)
+
+    def delete(self, user, alias):
+        """Delete the user's rows on alias, without sending signals"""
+        for through in (Recipe.tags.through, Recipe.ingredients.through):
+            through._base_manager.using(alias) \
+                .filter(recipe__user_id=user.pk)._raw_delete(alias)
+        for model in (Recipe, Tag, Ingredient):
+            model._base_manager.using(alias) \
+                .filter(user_id=user.pk)._raw_delete(alias)
+        if alias != DEFAULT_DB_ALIAS:
+            get_user_model()._base_manager.using(alias) \
+                .filter(pk=user.pk)._raw_delete(alias)
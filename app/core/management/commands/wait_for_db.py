@@ -1,25 +1,75 @@
+import json
+import random
 import time
 
+from django.core.management.base import BaseCommand, CommandError
 from django.db import connections
-from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+
+from core.health import check_databases
 
 
 class Command(BaseCommand):
-    """Django command to pause execution until database is available"""
+    """Django command to pause execution until database is available
+
+    Exits with status 0 once every database answers SELECT 1, and with
+    status 1 when --timeout runs out first.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='aliases',
+                            help='Alias to wait for, all of them by default')
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='Seconds to wait in total')
+        parser.add_argument('--probe-timeout', type=float, default=5,
+                            help='Seconds one connection attempt may take')
+        parser.add_argument('--max-delay', type=float, default=5,
+                            help='Longest pause between attempts')
+        parser.add_argument('--json', action='store_true',
+                            help='Print the outcome as one JSON line')
 
     # customize args and options with *args and **options
     def handle(self, *args, **options):
         """Handle the command"""
-        self.stdout.write('Waiting for database...')
-        db_conn = None
-        # while it's falsey try to set db connection
-        while not db_conn:
-            try:
-                db_conn = connections['default']
-            # if not then sleep for one second
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+        aliases = options['aliases'] or list(connections)
+        deadline = time.monotonic() + options['timeout']
+        if not options['json']:
+            self.stdout.write('Waiting for database...')
+
+        errors = {alias: None for alias in aliases}
+        pending = aliases
+        attempts = 0
+        while True:
+            attempts += 1
+            # only the databases that have not answered yet are probed again
+            errors.update(check_databases(
+                pending, min(options['probe_timeout'],
+                             max(deadline - time.monotonic(), 0.1))))
+            pending = [alias for alias in aliases if errors[alias]]
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            # exponential backoff, jittered so restarting containers do not
+            # all retry at the same moment
+            delay = min(options['max_delay'], 0.1 * 2 ** attempts)
+            delay = min(random.uniform(delay / 2, delay), remaining)
+            if not options['json']:
+                self.stdout.write(
+                    f'Database unavailable ({", ".join(pending)}), '
+                    f'waiting {delay:.1f} seconds...')
+            time.sleep(delay)
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'ready': not pending,
+                'attempts': attempts,
+                'databases': {alias: errors[alias] or 'ok'
+                              for alias in aliases},
+            }))
+        if pending:
+            raise CommandError(
+                'Database unavailable after {}s: {}'.format(
+                    options['timeout'], '; '.join(
+                        f'{alias}: {errors[alias]}' for alias in pending)))
         # once db is success it'll write this add green style to print to screen
-        self.stdout.write(self.style.SUCCESS('Database available!'))
\ No newline at end of file
+        if not options['json']:
+            self.stdout.write(self.style.SUCCESS('Database available!'))
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+# the auto created through tables only get the (recipe_id, <other>_id) unique
+# index, which serves ?tags=/?ingredients= filters on recipes. assigned_only
+# probes the tables from the other side so give it a matching index
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            ['CREATE INDEX core_recipe_tags_tag_recipe_idx '
+             'ON core_recipe_tags (tag_id, recipe_id)'],
+            ['DROP INDEX core_recipe_tags_tag_recipe_idx'],
+        ),
+        migrations.RunSQL(
+            ['CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx '
+             'ON core_recipe_ingredients (ingredient_id, recipe_id)'],
+            ['DROP INDEX core_recipe_ingredients_ingredient_recipe_idx'],
+        ),
+    ]
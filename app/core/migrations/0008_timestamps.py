@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def timestamp_fields(model_name):
+    """Add created_at/updated_at, existing rows get the migration time"""
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name='created_at',
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name=model_name,
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_through_indexes'),
+    ]
+
+    operations = (
+        timestamp_fields('ingredient') +
+        timestamp_fields('recipe') +
+        timestamp_fields('tag') + [
+            migrations.AddIndex(
+                model_name='recipe',
+                index=models.Index(
+                    fields=['user', 'updated_at'],
+                    name='core_recipe_user_id_57fcf6_idx'),
+            ),
+        ]
+    )
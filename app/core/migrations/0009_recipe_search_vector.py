@@ -0,0 +1,107 @@
+import re
+
+import core.fields
+from django.db import migrations
+
+
+# a copy of core.search as it was when this migration was written, so later
+# changes to the app code cannot change what it does
+
+SEARCH_CONFIG = 'english'
+
+WORD_RE = re.compile(r'\w+')
+
+POSTGRES_UPDATE_SQL = '''
+    UPDATE core_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, title), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_tag.name, ' ')
+            FROM core_recipe_tags
+            JOIN core_tag ON core_tag.id = core_recipe_tags.tag_id
+            WHERE core_recipe_tags.recipe_id = core_recipe.id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_ingredient.name, ' ')
+            FROM core_recipe_ingredients
+            JOIN core_ingredient
+                ON core_ingredient.id = core_recipe_ingredients.ingredient_id
+            WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+        ), '')), 'B')
+    WHERE id = ANY(%(ids)s)
+'''
+
+
+def _words(text):
+    """Return the lowercased words of text"""
+    return WORD_RE.findall(text.lower())
+
+
+def _update_search_vectors(apps, connection, recipe_ids):
+    """Rebuild the stored search document of the given recipes"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_UPDATE_SQL,
+                           {'config': SEARCH_CONFIG, 'ids': recipe_ids})
+        return
+
+    # a space padded string of words, matched with LIKE '% word %'
+    using = connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    documents = {
+        recipe_id: _words(title)
+        for recipe_id, title in Recipe.objects.using(using)
+        .filter(pk__in=recipe_ids).values_list('id', 'title')
+    }
+    for relation in ('tags', 'ingredients'):
+        through = getattr(Recipe, relation).through
+        field = getattr(Recipe, relation).field.m2m_reverse_field_name()
+        rows = through.objects.using(using) \
+            .filter(recipe_id__in=recipe_ids) \
+            .values_list('recipe_id', f'{field}__name')
+        for recipe_id, name in rows:
+            documents[recipe_id].extend(_words(name))
+
+    for recipe_id, document in documents.items():
+        Recipe.objects.using(using).filter(pk=recipe_id).update(
+            search_vector=' {} '.format(' '.join(document)))
+
+
+def backfill_search_vectors(apps, schema_editor):
+    """Build the search document of every existing recipe"""
+    Recipe = apps.get_model('core', 'Recipe')
+    using = schema_editor.connection.alias
+    ids = list(Recipe.objects.using(using).values_list('id', flat=True))
+    for start in range(0, len(ids), 1000):
+        _update_search_vectors(apps, schema_editor.connection,
+                               ids[start:start + 1000])
+
+
+def create_gin_index(apps, schema_editor):
+    """Index the tsvector column, only Postgres has GIN indexes"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX core_recipe_search_vector_gin '
+            'ON core_recipe USING GIN (search_vector)')
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX core_recipe_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=core.fields.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            backfill_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:22
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.utils import timezone
+
+
+# a copy of core.dedupe as it was when this migration was written, so later
+# changes to the app code cannot change what it does
+
+def _merge_into(Recipe, model, through, column, keep, duplicates, using):
+    """Link the recipes of the duplicates to keep and delete them"""
+    links = through.objects.using(using)
+    linked = set(links.filter(**{column: keep})
+                 .values_list('recipe_id', flat=True))
+    touched = set(links.filter(**{f'{column}__in': duplicates})
+                  .values_list('recipe_id', flat=True))
+    links.filter(**{f'{column}__in': duplicates}).delete()
+    links.bulk_create(
+        through(recipe_id=recipe_id, **{column: keep})
+        for recipe_id in sorted(touched - linked))
+    Recipe.objects.using(using).filter(pk__in=touched) \
+        .update(updated_at=timezone.now())
+    model.objects.using(using).filter(pk__in=duplicates).delete()
+
+
+def _normalize_names(Recipe, model, through, column, using):
+    """Collapse the whitespace of names, merging rows that then clash"""
+    for pk, user_id, name in list(
+            model.objects.using(using).order_by('pk')
+            .values_list('pk', 'user_id', 'name')):
+        normalized = ' '.join(name.split())
+        if name == normalized:
+            continue
+        keep = model.objects.using(using) \
+            .filter(user_id=user_id, name=normalized) \
+            .values_list('pk', flat=True).first()
+        if keep is None:
+            model.objects.using(using).filter(pk=pk).update(name=normalized)
+        else:
+            _merge_into(Recipe, model, through, column, keep, [pk], using)
+
+
+def _merge_duplicates(Recipe, model, through, column, using):
+    """Merge the rows sharing a user and name into the oldest one"""
+    groups = model.objects.using(using).values('user_id', 'name') \
+        .annotate(rows=Count('id'), keep=Min('id')) \
+        .filter(rows__gt=1).order_by()
+    for group in list(groups):
+        duplicates = list(
+            model.objects.using(using)
+            .filter(user_id=group['user_id'], name=group['name'])
+            .exclude(pk=group['keep']).values_list('pk', flat=True))
+        _merge_into(Recipe, model, through, column, group['keep'],
+                    duplicates, using)
+
+
+def merge_duplicate_attrs(apps, schema_editor):
+    """Merge duplicate tags and ingredients before they become unique"""
+    # run the merge_duplicate_attrs command beforehand to keep this short
+    Recipe = apps.get_model('core', 'Recipe')
+    using = schema_editor.connection.alias
+    for name, through, column in (
+            ('Tag', Recipe.tags.through, 'tag_id'),
+            ('Ingredient', Recipe.ingredients.through, 'ingredient_id')):
+        model = apps.get_model('core', name)
+        _normalize_names(Recipe, model, through, column, using)
+        _merge_duplicates(Recipe, model, through, column, using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_attrs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_ingredient_unique_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='core_tag_unique_user_name'),
+        ),
+    ]
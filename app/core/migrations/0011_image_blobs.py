@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:37
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    """Count the references of images uploaded before blobs existed"""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    using = schema_editor.connection.alias
+    counts = Recipe.objects.using(using).exclude(image__isnull=True) \
+        .exclude(image='').values('image').annotate(refcount=Count('id')) \
+        .order_by()
+    ImageBlob.objects.using(using).bulk_create(
+        (ImageBlob(name=row['image'], refcount=row['refcount'])
+         for row in counts.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_unique_attr_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
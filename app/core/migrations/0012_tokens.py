@@ -0,0 +1,42 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def copy_authtoken_tokens(apps, schema_editor):
+    """Keep the tokens issued by rest_framework.authtoken working"""
+    OldToken = apps.get_model('authtoken', 'Token')
+    Token = apps.get_model('core', 'Token')
+    using = schema_editor.connection.alias
+    now = django.utils.timezone.now()
+    # their lifetime starts now so existing clients are not all logged out
+    # by the upgrade
+    Token.objects.using(using).bulk_create(
+        (Token(key=token.key, user_id=token.user_id, created=now,
+               last_used=now)
+         for token in OldToken.objects.using(using).iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_image_blobs'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Token',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_authtoken_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_email_collisions(apps, schema_editor):
+    """Refuse to migrate while emails differ only in case"""
+    User = apps.get_model('core', 'User')
+    collisions = list(
+        User.objects.using(schema_editor.connection.alias)
+        .annotate(email_lower=Lower('email')).values('email_lower')
+        .annotate(count=Count('id')).filter(count__gt=1)
+        .order_by('email_lower').values_list('email_lower', flat=True)[:20])
+    if collisions:
+        raise RuntimeError(
+            'Several users have each of these emails in different cases, '
+            'merge or rename them before migrating: ' + ', '.join(collisions))
+
+
+# logins look users up by lower(email) (see UserManager.get_by_natural_key),
+# the expression index serves that lookup and keeps emails unique ignoring
+# case. Django 2.2 models can not declare expression indexes
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_email_collisions, migrations.RunPython.noop),
+        migrations.RunSQL(
+            ['CREATE UNIQUE INDEX core_user_email_lower_uniq '
+             'ON core_user (LOWER(email))'],
+            ['DROP INDEX core_user_email_lower_uniq'],
+        ),
+    ]
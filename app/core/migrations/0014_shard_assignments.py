@@ -0,0 +1,22 @@
+# Generated by Django 2.2.28 on 2026-10-18 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_user_email_lower_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardAssignment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(unique=True)),
+                ('alias', models.CharField(max_length=100)),
+                ('frozen', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
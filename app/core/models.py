@@ -1,10 +1,18 @@
+import binascii
 import uuid
 import os
+from datetime import timedelta
 
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 from django.conf import settings
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from core.fields import SearchVectorField
+from core.hashing import hash_password
+from core.storage import ContentAddressedStorage
 
 
 def recipe_image_file_path(instance, filename):
@@ -17,6 +25,23 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
+def normalize_name(name):
+    """Strip and collapse the whitespace of a tag or ingredient name"""
+    return ' '.join(name.split())
+
+
+class OwnedQuerySet(models.QuerySet):
+    """Queryset of rows owned by a user, see core.routers.ShardRouter"""
+
+    def create(self, **kwargs):
+        # like QuerySet.create, but unless using() was called the user the
+        # row is given picks its database rather than the queryset
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
 # This usermanager class is only for altering create_user or create_superuser
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -43,6 +68,15 @@ class UserManager(BaseUserManager):
 
         return user
 
+    def filter_email(self, email):
+        """Return the users with email ignoring case, the lookup uses the
+        lower(email) index"""
+        return self.annotate(email_lower=Lower('email')) \
+            .filter(email_lower=email.lower())
+
+    def get_by_natural_key(self, email):
+        return self.filter_email(email).get()
+
 
 class User(AbstractBaseUser, PermissionsMixin):
     # extends Django user model and we can customize it
@@ -56,33 +90,74 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
+    def set_password(self, raw_password):
+        # hashed in the bounded pool of core.hashing
+        self.password = hash_password(raw_password)
+        self._password = raw_password
+
 
 class Tag(models.Model):
     """Tag to be used for a recipe"""
+    objects = OwnedQuerySet.as_manager()
+
     name = models.CharField(max_length=255)
     # foreign key to user model
     # best practice is grabbing auth user from settings
     # ForeignKey(model, what happens when you delete)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # auto_now_add sets it once on create, auto_now on every save
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # matches the keyset the paginated tag list seeks on
+        indexes = [models.Index(fields=['user', '-name', 'id'])]
+        # one tag per name, see the merge_duplicate_attrs command
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='core_tag_unique_user_name'),
+        ]
 
     # string representation
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Ingredient(models.Model):
     """Ingredient to be used in a recipe"""
+    objects = OwnedQuerySet.as_manager()
+
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', '-name', 'id'])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_unique_user_name'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
 
 class Recipe(models.Model):
     """Recipe object"""
+    objects = OwnedQuerySet.as_manager()
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
@@ -93,7 +168,104 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # stored once per content, see core.storage
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path,
+                              storage=ContentAddressedStorage())
+    created_at = models.DateTimeField(auto_now_add=True)
+    # also bumped when tags or ingredients are added or removed
+    updated_at = models.DateTimeField(auto_now=True)
+    # title, tag and ingredient names, kept up to date by core.search
+    search_vector = SearchVectorField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id']),
+            # lets the conditional GET validator of the recipe list run as
+            # an index only scan
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        # the image as stored, recipe.signals counts its references when
+        # a save replaces it
+        if 'image' in field_names:
+            recipe._stored_image = values[field_names.index('image')] or None
+        return recipe
+
+
+class ImageBlob(models.Model):
+    """A stored image file and the number of recipes using it"""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TokenManager(models.Manager):
+    def expired(self, now=None):
+        """Return the tokens unused for TOKEN_EXPIRY['IDLE'] or older than
+        TOKEN_EXPIRY['MAX_AGE']"""
+        now = now or timezone.now()
+        options = settings.TOKEN_EXPIRY
+        return self.filter(
+            models.Q(last_used__lt=now - timedelta(seconds=options['IDLE'])) |
+            models.Q(created__lt=now - timedelta(seconds=options['MAX_AGE'])))
+
+    def issue(self, user):
+        """Return a token of the user that has not expired or a new one"""
+        token = self.filter(user=user).exclude(pk__in=self.expired()) \
+            .order_by('-created').first()
+        return token or self.create(user=user)
+
+
+class Token(models.Model):
+    """API token of a user, expires unless used every so often"""
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        related_name='auth_tokens')
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+    # written at most once per TOKEN_EXPIRY['REFRESH_INTERVAL'], see
+    # user.authentication
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = TokenManager()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super().save(*args, **kwargs)
+
+    @staticmethod
+    def generate_key():
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    def is_expired(self, now=None):
+        now = now or timezone.now()
+        options = settings.TOKEN_EXPIRY
+        return self.last_used < now - timedelta(seconds=options['IDLE']) or \
+            self.created < now - timedelta(seconds=options['MAX_AGE'])
+
+    def __str__(self):
+        return self.key
+
+
+class ShardAssignment(models.Model):
+    """Shard of a user that moved off the one its id hashes to
+
+    Lives on the default database, see core.sharding.
+    """
+    user_id = models.IntegerField(unique=True)
+    alias = models.CharField(max_length=100)
+    # writes are refused while the user's rows are copied to another shard
+    frozen = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.alias}'
@@ -0,0 +1,185 @@
+import random
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+from core.sharding import get_assignment, sharded_models, shard_for_user
+
+# the user of the current request, the replica it reads from and whether
+# it wrote
+_state = threading.local()
+
+
+class ShardRouter:
+    """Send the recipes, tags and ingredients of a user, with their
+    through rows, to the user's shard (see core.sharding)
+
+    The owner is taken from the instance hint, else from the user of the
+    request (see ReplicaReadMixin) or of core.sharding.for_user. Other
+    models, sharded ones with no known owner and users on the default
+    database are left to ReplicaRouter, replicas only copy the default
+    database.
+    """
+
+    def shard(self, model, hints):
+        if model not in sharded_models():
+            return None
+        shards = settings.DATABASE_SHARDS['SHARDS']
+        instance = hints.get('instance')
+        user_id = getattr(_state, 'user_id', None)
+        if isinstance(instance, get_user_model()):
+            # related managers of a user, user.recipe_set
+            user_id = instance.pk
+        elif instance is not None and instance._meta.model in \
+                sharded_models():
+            # rows read from a shard are written back to it
+            if instance._state.db in shards:
+                return None if instance._state.db == DEFAULT_DB_ALIAS \
+                    else instance._state.db
+            user_id = getattr(instance, 'user_id', None) or user_id
+        shard = shard_for_user(user_id) if user_id else None
+        return None if shard == DEFAULT_DB_ALIAS else shard
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self.shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # users live on the default database, with a copy on every shard
+        # their rows reference
+        if isinstance(obj1, get_user_model()) or \
+                isinstance(obj2, get_user_model()):
+            return True
+        return None
+
+
+class ReplicaRouter:
+    """Send reads of ReplicaReadMixin views to a replica, everything else
+    to the primary
+
+    A request reads from a replica only once its user is known and not
+    pinned (see ReplicaReadMixin), so token and user lookups always see
+    the primary. The first write moves the rest of the request to the
+    primary and pins the user there (see ReplicaPinMiddleware).
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.replica = None
+        _state.wrote = True
+        # rows read from a replica are saved to the primary, other aliases
+        # given with using() are kept
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and \
+                instance._state.db not in \
+                settings.DATABASE_ROUTING['REPLICAS']:
+            return instance._state.db
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_ROUTING['REPLICAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class PinStore:
+    """Users who wrote recently, kept in a LocMemBackend or RedisBackend"""
+
+    def __init__(self, backend, seconds):
+        self.backend = backend
+        self.seconds = seconds
+
+    def pin(self, user_id):
+        self.backend.set(f'db-pin:{user_id}', b'1', self.seconds)
+
+    def is_pinned(self, user_id):
+        return self.backend.get(f'db-pin:{user_id}') is not None
+
+
+_pin_store = None
+
+
+def get_pin_store():
+    """Return the pin store configured in DATABASE_ROUTING"""
+    global _pin_store
+    if _pin_store is None:
+        options = settings.DATABASE_ROUTING
+        _pin_store = PinStore(import_string(options['BACKEND'])(options),
+                              options.get('PIN_SECONDS', 5))
+    return _pin_store
+
+
+@receiver(setting_changed)
+def reset_pin_store(setting, **kwargs):
+    """Rebuild the store when tests override its settings"""
+    global _pin_store
+    if setting == 'DATABASE_ROUTING':
+        _pin_store = None
+
+
+class ShardMoving(APIException):
+    status_code = 503
+    default_detail = 'Your data is being moved, try again shortly.'
+    default_code = 'shard_moving'
+
+    def __init__(self, wait):
+        super().__init__()
+        # sent as Retry-After
+        self.wait = wait
+
+
+class ReplicaReadMixin:
+    """Let safe requests of a view read from a replica, and route the
+    queries of the view to the shard of the user
+
+    Writes of a user whose rows are being moved to another shard are
+    refused with a 503 until the move is done (see move_user_shard).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        # authentication runs in here and reads from the primary
+        super().initial(request, *args, **kwargs)
+        replicas = settings.DATABASE_ROUTING['REPLICAS']
+        _state.user_id = request.user.pk
+        if request.user.pk and request.method not in SAFE_METHODS and \
+                get_assignment(request.user.pk)[1]:
+            raise ShardMoving(
+                max(settings.DATABASE_SHARDS.get('DIRECTORY_TTL', 30), 1))
+        if replicas and request.method in SAFE_METHODS and \
+                not getattr(_state, 'wrote', False) and \
+                not (request.user.pk and
+                     get_pin_store().is_pinned(request.user.pk)):
+            _state.replica = random.choice(replicas)
+
+
+class ReplicaPinMiddleware:
+    """Pin users who wrote to the primary for DATABASE_ROUTING
+    ['PIN_SECONDS'], so they read their own writes"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.__dict__.clear()
+        try:
+            response = self.get_response(request)
+            user_id = getattr(_state, 'user_id', None)
+            if getattr(_state, 'wrote', False) and user_id is not None and \
+                    settings.DATABASE_ROUTING['REPLICAS']:
+                get_pin_store().pin(user_id)
+        finally:
+            _state.__dict__.clear()
+        return response
@@ -0,0 +1,115 @@
+import re
+
+from django.apps import apps as global_apps
+from django.db import connections
+from django.db.models import BooleanField, Case, F, FloatField, Func, \
+    IntegerField, Value, When
+from django.db.models.functions import Cast
+
+# text search configuration used to stem recipe documents and queries
+SEARCH_CONFIG = 'english'
+
+WORD_RE = re.compile(r'\w+')
+
+# title words weigh more than tag and ingredient names when ranking
+POSTGRES_UPDATE_SQL = '''
+    UPDATE core_recipe SET search_vector =
+        setweight(to_tsvector(%(config)s, title), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_tag.name, ' ')
+            FROM core_recipe_tags
+            JOIN core_tag ON core_tag.id = core_recipe_tags.tag_id
+            WHERE core_recipe_tags.recipe_id = core_recipe.id
+        ), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(core_ingredient.name, ' ')
+            FROM core_recipe_ingredients
+            JOIN core_ingredient
+                ON core_ingredient.id = core_recipe_ingredients.ingredient_id
+            WHERE core_recipe_ingredients.recipe_id = core_recipe.id
+        ), '')), 'B')
+    WHERE id = ANY(%(ids)s)
+'''
+
+
+def words(text):
+    """Return the lowercased words of text"""
+    return WORD_RE.findall(text.lower())
+
+
+def update_search_vectors(recipe_ids, using='default', apps=global_apps):
+    """Rebuild the stored search document of the given recipes"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(POSTGRES_UPDATE_SQL,
+                           {'config': SEARCH_CONFIG, 'ids': recipe_ids})
+        return
+
+    # portable fallback, a space padded string of words so that a word can
+    # be matched with a plain LIKE '% word %'
+    Recipe = apps.get_model('core', 'Recipe')
+    documents = {
+        recipe_id: words(title)
+        for recipe_id, title in Recipe.objects.using(using)
+        .filter(pk__in=recipe_ids).values_list('id', 'title')
+    }
+    for relation in ('tags', 'ingredients'):
+        through = getattr(Recipe, relation).through
+        field = getattr(Recipe, relation).field.m2m_reverse_field_name()
+        rows = through.objects.using(using) \
+            .filter(recipe_id__in=recipe_ids) \
+            .values_list('recipe_id', f'{field}__name')
+        for recipe_id, name in rows:
+            documents[recipe_id].extend(words(name))
+
+    for recipe_id, document in documents.items():
+        Recipe.objects.using(using).filter(pk=recipe_id).update(
+            search_vector=' {} '.format(' '.join(document)))
+
+
+class PlainToTsQuery(Func):
+    function = 'plainto_tsquery'
+
+
+class TsRank(Func):
+    function = 'ts_rank'
+    output_field = FloatField()
+
+
+def search_recipes(queryset, query):
+    """Filter recipes matching query, annotated with a search_rank"""
+    if connections[queryset.db].vendor != 'postgresql':
+        return _search_recipes_fallback(queryset, query)
+
+    tsquery = PlainToTsQuery(Value(SEARCH_CONFIG), Value(query))
+    return queryset.annotate(
+        search_match=Func(
+            F('search_vector'), tsquery, arg_joiner=' @@ ',
+            template='(%(expressions)s)', output_field=BooleanField()),
+        # double precision so the rank survives the trip through a cursor
+        search_rank=Cast(TsRank(F('search_vector'), tsquery), FloatField()),
+    ).filter(search_match=True)
+
+
+def _search_recipes_fallback(queryset, query):
+    """Match every word of query, rank by words found in the title"""
+    terms = words(query)
+    if not terms:
+        return queryset.none()
+
+    for term in terms:
+        queryset = queryset.filter(search_vector__contains=f' {term} ')
+    title_matches = [
+        Case(When(title__icontains=term, then=Value(1)),
+             default=Value(0), output_field=IntegerField())
+        for term in terms
+    ]
+    rank = title_matches[0]
+    for match in title_matches[1:]:
+        rank = rank + match
+    return queryset.annotate(search_rank=Cast(rank, FloatField()))
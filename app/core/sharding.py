@@ -0,0 +1,174 @@
+import zlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.cache import LRUCache
+
+
+def sharded_models():
+    """Return the models stored on the shard of their owner"""
+    from core.models import Ingredient, Recipe, Tag
+    return (Tag, Ingredient, Recipe,
+            Recipe.tags.through, Recipe.ingredients.through)
+
+
+_assignments = None
+
+
+def get_assignments():
+    """Return the cache of directory lookups"""
+    global _assignments
+    if _assignments is None:
+        options = settings.DATABASE_SHARDS
+        _assignments = LRUCache(
+            max_entries=options.get('DIRECTORY_ENTRIES', 100000),
+            timeout=options.get('DIRECTORY_TTL', 30))
+    return _assignments
+
+
+@receiver(setting_changed)
+def reset_assignments(setting, **kwargs):
+    """Forget cached lookups when tests override the shards"""
+    global _assignments
+    if setting == 'DATABASE_SHARDS':
+        _assignments = None
+
+
+def hashed_shard(user_id):
+    """Return the shard a user id hashes to"""
+    shards = settings.DATABASE_SHARDS['SHARDS']
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def get_assignment(user_id):
+    """Return (alias, frozen) of a user's shard
+
+    A ShardAssignment row overrides the hash. Lookups are cached for
+    DIRECTORY_TTL seconds, so moves wait that long before they rely on
+    every process seeing a change (see move_user_shard).
+    """
+    if len(settings.DATABASE_SHARDS['SHARDS']) == 1:
+        return settings.DATABASE_SHARDS['SHARDS'][0], False
+    cache = get_assignments()
+    assignment = cache.get(user_id)
+    if assignment is None:
+        from core.models import ShardAssignment
+        assignment = ShardAssignment.objects.using(DEFAULT_DB_ALIAS) \
+            .filter(user_id=user_id).values_list('alias', 'frozen') \
+            .first() or (hashed_shard(user_id), False)
+        cache.set(user_id, assignment)
+    return assignment
+
+
+def shard_for_user(user_id):
+    """Return the alias of the database holding a user's rows"""
+    return get_assignment(user_id)[0]
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def mirror_user(sender, instance, using, raw, **kwargs):
+    """Copy a user to their shard, so its foreign keys to the user hold"""
+    shard = shard_for_user(instance.pk)
+    if raw or using != DEFAULT_DB_ALIAS or shard == DEFAULT_DB_ALIAS:
+        return
+    # only what the row needs to exist, credentials stay on default
+    sender.objects.using(shard).update_or_create(
+        pk=instance.pk, defaults={
+            'email': instance.email, 'password': '!',
+            'is_active': instance.is_active,
+        })
+
+
+def mirror_users(users):
+    """Copy users created with bulk_create to their shards"""
+    if len(settings.DATABASE_SHARDS['SHARDS']) == 1:
+        return
+    from core.models import ShardAssignment
+    assigned = dict(ShardAssignment.objects.using(DEFAULT_DB_ALIAS)
+                    .filter(user_id__in=[user.pk for user in users])
+                    .values_list('user_id', 'alias'))
+    by_shard = {}
+    for user in users:
+        shard = assigned.get(user.pk) or hashed_shard(user.pk)
+        if shard != DEFAULT_DB_ALIAS:
+            by_shard.setdefault(shard, []).append(
+                type(user)(pk=user.pk, email=user.email, password='!',
+                           is_active=user.is_active))
+    for shard, mirrors in by_shard.items():
+        type(users[0]).objects.using(shard).bulk_create(
+            mirrors, ignore_conflicts=True)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_rows(sender, instance, using, **kwargs):
+    """Delete a user's rows on their shard along with the user"""
+    if using != DEFAULT_DB_ALIAS:
+        return
+    shard = shard_for_user(instance.pk)
+    if shard != DEFAULT_DB_ALIAS:
+        # cascades to the recipes, tags and ingredients on the shard
+        sender.objects.using(shard).filter(pk=instance.pk).delete()
+    from core.models import ShardAssignment
+    ShardAssignment.objects.using(DEFAULT_DB_ALIAS) \
+        .filter(user_id=instance.pk).delete()
+    get_assignments().delete(instance.pk)
+
+
+# auto increment columns of sharded models, ids must not collide when
+# move_user_shard copies rows from one shard to another
+ID_TABLES = ('core_recipe', 'core_tag', 'core_ingredient')
+
+
+def reserve_id_range(alias):
+    """Start the ids of a shard at its index times DATABASE_SHARDS
+    ['ID_SPAN'], so every shard hands out its own range"""
+    shards = settings.DATABASE_SHARDS['SHARDS']
+    start = shards.index(alias) * settings.DATABASE_SHARDS['ID_SPAN']
+    if not start:
+        return
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for table in ID_TABLES:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT setval(pg_get_serial_sequence(%s, %s), '
+                    'GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {})))'
+                    .format(connection.ops.quote_name(table)),
+                    [table, 'id', start])
+            elif connection.vendor == 'sqlite':
+                # Django declares sqlite ids AUTOINCREMENT. Unlike a
+                # sequence the counter follows the largest id inserted, so
+                # rows moved in from a later shard move it into that
+                # shard's range, good enough for the tests
+                cursor.execute(
+                    'DELETE FROM sqlite_sequence WHERE name = %s AND '
+                    'seq < %s', [table, start])
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                    'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence '
+                    'WHERE name = %s)', [table, start, table])
+
+
+@receiver(post_migrate)
+def reserve_shard_id_ranges(sender, using, **kwargs):
+    if sender.name == 'core' and \
+            using in settings.DATABASE_SHARDS['SHARDS']:
+        reserve_id_range(using)
+
+
+@contextmanager
+def for_user(user_id):
+    """Route queries without an instance to a user's shard, for code
+    running outside requests"""
+    from core.routers import _state
+    previous = getattr(_state, 'user_id', None)
+    _state.user_id = user_id
+    try:
+        yield shard_for_user(user_id)
+    finally:
+        _state.user_id = previous
@@ -0,0 +1,79 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(content):
+    """Return the sha256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Store every file once, named after the sha256 of its content
+
+    Files go to <prefix>/ab/cd/abcd...<ext>, two directory levels keep any
+    one directory small. Saving bytes that are already stored reuses the
+    file. Each file has an ImageBlob row counting the recipes using it,
+    see retain and release.
+    """
+
+    def __init__(self, prefix='uploads/recipe', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def digest_name(self, digest, ext):
+        """Return the name a file with the given digest is stored under"""
+        return os.path.join(
+            self.prefix, digest[:2], digest[2:4], f'{digest}{ext.lower()}')
+
+    def _save(self, name, content):
+        # uploads hash themselves while they stream, see recipe.uploads
+        digest = getattr(content, 'digest', None) or file_digest(content)
+        name = self.digest_name(digest, os.path.splitext(name)[1])
+
+        ImageBlob = apps.get_model('core', 'ImageBlob')
+        with transaction.atomic():
+            # the lock keeps release from deleting the file meanwhile
+            ImageBlob.objects.select_for_update().get_or_create(name=name)
+            if not self.exists(name):
+                return super()._save(name, content)
+        # a reused file counts as new, clean_media skips recent files so it
+        # cannot remove one before the recipe using it is saved
+        os.utime(self.path(name))
+        return name
+
+    def retain(self, name):
+        """Count one more reference to a stored file"""
+        ImageBlob = apps.get_model('core', 'ImageBlob')
+        if not ImageBlob.objects.filter(name=name) \
+                .update(refcount=F('refcount') + 1):
+            ImageBlob.objects.get_or_create(
+                name=name, defaults={'refcount': 1})
+
+    def release(self, name):
+        """Drop one reference, return True if the file was deleted"""
+        ImageBlob = apps.get_model('core', 'ImageBlob')
+        with transaction.atomic():
+            blob = ImageBlob.objects.select_for_update() \
+                .filter(name=name).first()
+            if blob is None:
+                # not counted, leave it to the clean up command
+                return False
+            if blob.refcount > 1:
+                ImageBlob.objects.filter(pk=blob.pk) \
+                    .update(refcount=F('refcount') - 1)
+                return False
+            blob.delete()
+            self.delete(name)
+        return True
@@ -0,0 +1,125 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+from core.backends import connection_options
+from core.backends.mixins import HealthCheckMixin, ServerTimeZoneMixin
+
+
+class CheckedDatabaseWrapper(HealthCheckMixin, DatabaseWrapper):
+    pass
+
+
+class TimeZoneDatabaseWrapper(ServerTimeZoneMixin, DatabaseWrapper):
+    pass
+
+
+class ConnectionOptionsTests(SimpleTestCase):
+    """Test the connection modes"""
+
+    def test_modes(self):
+        """Test each mode sets the connection lifetime and cursors"""
+        self.assertEqual(connection_options('per-request'),
+                         {'CONN_MAX_AGE': 0})
+        self.assertEqual(connection_options('persistent', 60), {
+            'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True})
+        self.assertTrue(connection_options('pgbouncer')[
+            'DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertTrue(connection_options('pgbouncer')[
+            'CHECK_SERVER_TIME_ZONE'])
+
+    def test_unknown_mode(self):
+        """Test a misspelled mode fails loudly"""
+        with self.assertRaises(ImproperlyConfigured):
+            connection_options('pooled')
+
+
+class HealthCheckTests(SimpleTestCase):
+    """Test persistent connections are checked between requests"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.connection = CheckedDatabaseWrapper({
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+            'ATOMIC_REQUESTS': False,
+            'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+        }, alias='checked')
+        self.addCleanup(self.connection.close)
+        self.connection.ensure_connection()
+        self.raw = self.connection.connection
+
+    def test_usable_connection_kept(self):
+        """Test a working connection is reused by the next request"""
+        self.connection.close_if_unusable_or_obsolete()
+        self.connection.ensure_connection()
+
+        self.assertIs(self.connection.connection, self.raw)
+
+    def test_broken_connection_replaced(self):
+        """Test a dropped connection is replaced before it is used"""
+        self.connection.close_if_unusable_or_obsolete()
+        with patch.object(self.connection, 'is_usable', return_value=False):
+            self.connection.ensure_connection()
+
+        self.assertIsNotNone(self.connection.connection)
+        self.assertIsNot(self.connection.connection, self.raw)
+
+    def test_checked_once_per_request(self):
+        """Test only the first use after a request boundary is checked"""
+        self.connection.close_if_unusable_or_obsolete()
+        with patch.object(self.connection, 'is_usable',
+                          return_value=True) as is_usable:
+            self.connection.ensure_connection()
+            self.connection.ensure_connection()
+
+        self.assertEqual(is_usable.call_count, 1)
+
+
+class ServerTimeZoneTests(SimpleTestCase):
+    """Test servers in another time zone than the connection are reported"""
+
+    def make_connection(self, time_zone):
+        connection = TimeZoneDatabaseWrapper({
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+            'ATOMIC_REQUESTS': False,
+            'AUTOCOMMIT': True,
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'CHECK_SERVER_TIME_ZONE': True,
+        }, alias='zoned')
+        self.addCleanup(connection.close)
+        patcher = patch.object(connection, 'server_time_zone',
+                               return_value=time_zone)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return connection
+
+    def test_utc_server_accepted(self):
+        """Test a server in the connection's time zone is used silently"""
+        with patch('core.backends.mixins.logger') as logger:
+            self.make_connection('UTC').ensure_connection()
+
+        logger.warning.assert_not_called()
+
+    def test_other_time_zone_reported(self):
+        """Test a server in another time zone is logged but still used"""
+        for time_zone in ('Etc/UTC', 'Europe/London'):
+            connection = self.make_connection(time_zone)
+
+            with self.assertLogs('core.backends.mixins', 'WARNING') as logs:
+                connection.ensure_connection()
+
+            self.assertIn(time_zone, logs.output[0])
+            self.assertIsNotNone(connection.connection)
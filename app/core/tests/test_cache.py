@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.cache import LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_get_and_set(self):
+        """Test values can be stored and read back"""
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry is evicted first"""
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        # reading a makes b the least recently used one
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_evicts_by_size(self):
+        """Test entries are evicted once max_bytes is exceeded"""
+        cache = LRUCache(max_entries=100, max_bytes=10)
+        cache.set('a', b'12345')
+        cache.set('b', b'12345')
+        cache.set('c', b'1')
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['bytes'], 6)
+
+    def test_entry_larger_than_max_bytes_not_stored(self):
+        """Test a value bigger than the whole cache is skipped"""
+        cache = LRUCache(max_bytes=4)
+        cache.set('a', b'12345')
+
+        self.assertIsNone(cache.get('a'))
+
+    @patch('time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are dropped after their timeout"""
+        monotonic.return_value = 100
+        cache = LRUCache(timeout=10)
+        cache.set('a', 1)
+
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
@@ -1,12 +1,19 @@
 # mocking tests
 # so you don't rely on external services
+import json
+from io import StringIO
 from unittest.mock import patch
 
 # stimulate calling db and seeing if it's available
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.db.utils import OperationalError
+from django.core.management.base import CommandError
 from django.test import TestCase
 
+from core.models import Recipe, Tag
+from core.search import search_recipes
+from recipe.cache import get_response_cache
+
 class CommandTests(TestCase):
 
     def test_wait_for_db_ready(self):
@@ -14,24 +21,113 @@ class CommandTests(TestCase):
 
         # need to mock when db is connected and available
         # operational db
-        # mock connection handler grabbing db
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        # mock the probe running SELECT 1 against every alias
+        with patch('core.management.commands.wait_for_db.check_databases') \
+                as cd:
+            cd.return_value = {'default': None}
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 1)
 
     # here using patch as decorator is similar to with patch(...)
     # pass return value as part of function call
     # except pass in as argument in function, in example as ts
-    # above it was as gi
+    # above it was as cd
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
+        with patch('core.management.commands.wait_for_db.check_databases') \
+                as cd:
             # sideffect to test
-            # raise op error 5 times
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+            # fail 5 times
+            cd.side_effect = [{'default': 'OperationalError'}] * 5 + \
+                [{'default': None}]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 6)
+            # backs off between attempts, up to --max-delay
+            delays = [call[0][0] for call in ts.call_args_list]
+            self.assertEqual(len(delays), 5)
+            self.assertTrue(all(0 < delay <= 5 for delay in delays))
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, ts):
+        """Test giving up once the timeout is spent"""
+        out = StringIO()
+        with patch('core.management.commands.wait_for_db.check_databases') \
+                as cd:
+            cd.return_value = {'default': 'OperationalError: refused'}
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', '--database', 'default',
+                             '--timeout', '0', '--json', stdout=out)
+
+        self.assertEqual(json.loads(out.getvalue()), {
+            'ready': False,
+            'attempts': 1,
+            'databases': {'default': 'OperationalError: refused'},
+        })
+
+    def test_wait_for_db_probes_database(self):
+        """Test the probe really queries the database"""
+        out = StringIO()
+        call_command('wait_for_db', '--json', stdout=out)
+
+        self.assertTrue(json.loads(out.getvalue())['ready'])
+
+    def test_merge_duplicate_attrs(self):
+        """Test merging tags whose names only differ by whitespace"""
+        user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        # bulk_create skips save(), like rows written before names were
+        # normalized
+        Tag.objects.bulk_create([
+            Tag(user=user, name='Vegan'),
+            Tag(user=user, name='Vegan '),
+            Tag(user=user, name=' Quick  lunch'),
+        ])
+        vegan, spaced, padded = Tag.objects.order_by('id')
+        both = Recipe.objects.create(
+            user=user, title='Salad', time_minutes=5, price=5)
+        both.tags.add(vegan, spaced)
+        moved = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=5)
+        moved.tags.add(spaced, padded)
+
+        call_command('merge_duplicate_attrs', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['Quick lunch', 'Vegan'])
+        self.assertEqual(list(both.tags.all()), [vegan])
+        self.assertEqual(
+            sorted(moved.tags.values_list('name', flat=True)),
+            ['Quick lunch', 'Vegan'])
+
+    def test_merge_duplicate_attrs_bumps_recipes(self):
+        """Test recipes of renamed tags show up as changed"""
+        user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        Tag.objects.bulk_create([Tag(user=user, name='Quick  lunch')])
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=5)
+        recipe.tags.add(Tag.objects.get())
+        recipe.refresh_from_db()
+        cache = get_response_cache()
+        generation = cache.generation(user.pk)
+
+        call_command('merge_duplicate_attrs', stdout=StringIO())
+
+        updated_at = recipe.updated_at
+        recipe.refresh_from_db()
+        self.assertGreater(recipe.updated_at, updated_at)
+        self.assertNotEqual(cache.generation(user.pk), generation)
+        self.assertTrue(search_recipes(
+            Recipe.objects.all(), 'lunch').filter(pk=recipe.pk).exists())
+
+    def test_merge_duplicate_attrs_dry_run(self):
+        """Test that a dry run changes nothing"""
+        user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        Tag.objects.bulk_create([Tag(user=user, name='Vegan ')])
 
+        call_command('merge_duplicate_attrs', '--dry-run', stdout=StringIO())
 
+        self.assertTrue(Tag.objects.filter(name='Vegan ').exists())
@@ -0,0 +1,95 @@
+import threading
+
+from django.contrib.auth import authenticate, get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashing import HashingPool, HashingUnavailable, get_hashing_pool
+
+PBKDF2_HASHERS = ['core.hashing.ConfiguredPBKDF2PasswordHasher']
+
+
+class HashingPoolTests(TestCase):
+    """Test the bounded password hashing pool"""
+
+    def test_run_returns_result(self):
+        """Test jobs run in the pool and return their result"""
+        pool = HashingPool(1)
+        self.addCleanup(pool.shutdown)
+
+        self.assertEqual(pool.run(sum, [1, 2]), 3)
+
+    def test_saturated_pool_sheds(self):
+        """Test jobs beyond workers and queue are refused at once"""
+        pool = HashingPool(1, max_queue=0)
+        self.addCleanup(pool.shutdown)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        thread = threading.Thread(target=pool.run, args=(block, ))
+        thread.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(HashingUnavailable):
+                pool.run(sum, [1])
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(pool.run(sum, [1]), 1)
+
+    @override_settings(PASSWORD_HASHING={'WORKERS': 1, 'MAX_QUEUE': 0})
+    def test_login_shed_with_429(self):
+        """Test logins get a 429 while the pool is saturated"""
+        get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        # as if another login were hashing
+        pool = get_hashing_pool()
+        pool.slots.acquire()
+        self.addCleanup(pool.slots.release)
+
+        res = APIClient().post(reverse('user:token'), {
+            'email': 'test@londonappdev.com', 'password': 'testpass'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(PASSWORD_HASHERS=PBKDF2_HASHERS)
+class RehashTests(TestCase):
+    """Test stored passwords follow the configured hasher on login"""
+
+    def test_rehash_on_cost_change(self):
+        """Test a login rehashes a password of an outdated cost"""
+        with self.settings(PASSWORD_HASHING={'WORKERS': 1,
+                                             'ITERATIONS': 1000}):
+            user = get_user_model().objects.create_user(
+                'test@londonappdev.com', 'testpass')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with self.settings(PASSWORD_HASHING={'WORKERS': 1,
+                                             'ITERATIONS': 2000}):
+            self.assertEqual(authenticate(
+                username='test@londonappdev.com', password='testpass'), user)
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_wrong_password_not_rehashed(self):
+        """Test a failed login leaves the stored hash alone"""
+        with self.settings(PASSWORD_HASHING={'WORKERS': 1,
+                                             'ITERATIONS': 1000}):
+            user = get_user_model().objects.create_user(
+                'test@londonappdev.com', 'testpass')
+        encoded = user.password
+
+        with self.settings(PASSWORD_HASHING={'WORKERS': 1,
+                                             'ITERATIONS': 2000}):
+            self.assertIsNone(authenticate(
+                username='test@londonappdev.com', password='wrong'))
+
+        user.refresh_from_db()
+        self.assertEqual(user.password, encoded)
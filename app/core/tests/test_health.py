@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from django.db import connections
+from django.test import TestCase
+from django.urls import reverse
+
+
+class HealthTests(TestCase):
+    """Test the liveness and readiness endpoints"""
+
+    def test_live(self):
+        """Test the liveness endpoint answers without the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('health-live'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), {'status': 'ok'})
+
+    def test_ready(self):
+        """Test the readiness endpoint probes the databases"""
+        res = self.client.get(reverse('health-ready'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['databases'],
+                         {alias: 'ok' for alias in connections})
+
+    def test_not_ready(self):
+        """Test a database that does not answer makes the pod unready"""
+        with patch('core.health.probe_database') as probe:
+            probe.return_value = 'OperationalError: refused'
+            res = self.client.get(reverse('health-ready'))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json()['status'], 'unavailable')
+        self.assertEqual(res.json()['databases']['default'],
+                         'OperationalError: refused')
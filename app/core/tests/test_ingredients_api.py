@@ -5,11 +5,12 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import Ingredient, Recipe
 
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
 
 
 class PublicIngredientsApiTests(TestCase):
@@ -44,7 +45,7 @@ class PrivateIngredientsAPITests(TestCase):
         ingredients = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredients, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test that only ingredients for authenticated user are returned"""
@@ -57,8 +58,8 @@ class PrivateIngredientsAPITests(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successful(self):
         """Test creating a new ingredient"""
@@ -75,4 +76,30 @@ class PrivateIngredientsAPITests(TestCase):
         payload = {'name': ''}
         res = self.client.post(INGREDIENTS_URL, payload)
 
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_get_or_create_ingredients(self):
+        """Test that bulk maps every name to one ingredient"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+        res = self.client.post(INGREDIENTS_BULK_URL,
+                               {'names': ['Salt', 'Pepper', 'Pepper']},
+                               format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        pepper = Ingredient.objects.get(user=self.user, name='Pepper')
+        self.assertEqual(res.data, {'Salt': salt.id, 'Pepper': pepper.id})
+
+    def test_retrieve_ingredients_assigned_to_recipes(self):
+        """Test filtering ingredients by those assigned to recipes"""
+        ingredient1 = Ingredient.objects.create(user=self.user, name='Apples')
+        ingredient2 = Ingredient.objects.create(user=self.user, name='Turkey')
+        recipe = Recipe.objects.create(
+            title='Apple crumble', time_minutes=5, price=10, user=self.user)
+        recipe.ingredients.add(ingredient1)
+
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+
+        names = [item['name'] for item in res.data['results']]
+        self.assertIn(ingredient1.name, names)
+        self.assertNotIn(ingredient2.name, names)
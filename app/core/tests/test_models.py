@@ -1,3 +1,4 @@
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from core import models
@@ -29,6 +30,15 @@ class ModelTests(TestCase):
 
         self.assertEqual(user.email, email.lower())
 
+    def test_user_email_unique_ignoring_case(self):
+        """Test emails differing only in case belong to one user"""
+        user = sample_user('Steve@londonappdev.com')
+
+        self.assertEqual(get_user_model().objects.get_by_natural_key(
+            'steve@LONDONAPPDEV.com'), user)
+        with self.assertRaises(IntegrityError):
+            sample_user('steve@londonappdev.com')
+
     def test_new_user_invalid_email(self):
         """Test creating user with no email raises error"""
         # no email address should raise a value error
@@ -57,6 +67,23 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_normalized(self):
+        """Test that the whitespace of tag names is normalized"""
+        tag = models.Tag.objects.create(
+            user=sample_user(), name=' Sea   salt ')
+
+        self.assertEqual(tag.name, 'Sea salt')
+
+    def test_tag_name_unique_per_user(self):
+        """Test that a user cannot have the same tag twice"""
+        user = sample_user()
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(
+            user=sample_user('other@londonappdev.com'), name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan ')
+
     def test_recipe_str(self):
         """Test the recipe string representation"""
         recipe = models.Recipe.objects.create(
@@ -0,0 +1,79 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Token
+
+TAGS_URL = reverse('recipe:tag-list')
+
+ROUTING = {
+    'REPLICAS': ['replica'],
+    'PIN_SECONDS': 5,
+    'BACKEND': 'recipe.cache.LocMemBackend',
+}
+
+
+@skipUnless('replica' in settings.DATABASES,
+            'needs the replica database of app.test_settings')
+@override_settings(DATABASE_ROUTING=ROUTING)
+class ReplicaRoutingTests(TestCase):
+    """Test reads go to the replica unless the user just wrote"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        # the test databases do not replicate, rows written to only one of
+        # them tell which one a request read
+        self.user.save(using='replica')
+        Tag.objects.create(user=self.user, name='Primary')
+        Tag.objects.using('replica').create(user=self.user, name='Replica')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tag_names(self):
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [tag['name'] for tag in res.data['results']]
+
+    def test_reads_from_replica(self):
+        """Test safe requests read from the replica"""
+        self.assertEqual(self.tag_names(), ['Replica'])
+
+    def test_writes_pin_user_to_primary(self):
+        """Test a user reads their own writes"""
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Tag.objects.using('replica')
+                         .filter(name='Vegan').exists())
+        self.assertEqual(sorted(self.tag_names()), ['Primary', 'Vegan'])
+
+    @override_settings(DATABASE_ROUTING=dict(ROUTING, PIN_SECONDS=0))
+    def test_pin_expires(self):
+        """Test reads return to the replica once the pin expires"""
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(self.tag_names(), ['Replica'])
+
+    @override_settings(DATABASE_ROUTING=dict(ROUTING, REPLICAS=[]))
+    def test_no_replicas(self):
+        """Test everything reads from the primary without replicas"""
+        self.assertEqual(self.tag_names(), ['Primary'])
+
+    def test_authentication_reads_primary(self):
+        """Test tokens are looked up on the primary"""
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['Replica'])
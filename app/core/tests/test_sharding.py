@@ -0,0 +1,139 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, ShardAssignment, Tag
+from core.sharding import hashed_shard, reserve_id_range, shard_for_user
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+SHARDS = {
+    'SHARDS': ['default', 'shard1'],
+    'ID_SPAN': 100_000_000,
+    # every lookup reads the directory, no process can hold a stale one
+    'DIRECTORY_TTL': 0,
+}
+
+
+def create_user(email):
+    return get_user_model().objects.create_user(email, 'testpass')
+
+
+@skipUnless('shard1' in settings.DATABASES,
+            'needs the shard1 database of app.test_settings')
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    """Test the rows of a user are kept on the user's shard"""
+    databases = {'default', 'shard1'}
+
+    def setUp(self):
+        reserve_id_range('shard1')
+        self.user = create_user('test@londonappdev.com')
+        # the shard the id hashes to is not known up front
+        ShardAssignment.objects.create(user_id=self.user.pk, alias='shard1')
+        self.user.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_hash_is_stable(self):
+        """Test users are spread over the shards by a stable hash"""
+        shards = [hashed_shard(user_id) for user_id in range(1000)]
+
+        self.assertEqual(shards, [hashed_shard(user_id)
+                                  for user_id in range(1000)])
+        self.assertGreater(shards.count('shard1'), 400)
+        self.assertGreater(shards.count('default'), 400)
+
+    def test_user_copied_to_shard(self):
+        """Test the user has a row on their shard, without the password"""
+        copy = get_user_model().objects.using('shard1').get(pk=self.user.pk)
+
+        self.assertEqual(copy.email, self.user.email)
+        self.assertFalse(copy.has_usable_password())
+
+    def test_api_writes_to_shard(self):
+        """Test recipes and their relations are stored on the shard"""
+        tag = self.client.post(TAGS_URL, {'name': 'Vegan'}).data
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 30, 'price': '5.00',
+            'tags': [tag['id']],
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Recipe.objects.using('default').exists())
+        recipe = Recipe.objects.using('shard1').get(pk=res.data['id'])
+        self.assertEqual(list(recipe.tags.values_list('name', flat=True)),
+                         ['Vegan'])
+        # ids come from the range of the shard
+        self.assertGreaterEqual(recipe.pk, SHARDS['ID_SPAN'])
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['title'] for item in res.data['results']],
+                         ['Curry'])
+
+    def test_users_isolated(self):
+        """Test users on different shards only see their own rows"""
+        other = create_user('other@londonappdev.com')
+        ShardAssignment.objects.create(user_id=other.pk, alias='default')
+        Tag.objects.create(user=other, name='Default')
+        Tag.objects.create(user=self.user, name='Shard')
+
+        self.assertEqual(Tag.objects.using('default').get().name, 'Default')
+        self.assertEqual(Tag.objects.using('shard1').get().name, 'Shard')
+        res = self.client.get(TAGS_URL)
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['Shard'])
+
+    def test_delete_user_deletes_shard_rows(self):
+        """Test deleting a user removes their rows on the shard"""
+        Ingredient.objects.create(user=self.user, name='Salt')
+
+        self.user.delete()
+
+        self.assertFalse(Ingredient.objects.using('shard1').exists())
+        self.assertFalse(get_user_model().objects.using('shard1').exists())
+        self.assertFalse(ShardAssignment.objects.exists())
+
+    def test_frozen_user_cannot_write(self):
+        """Test writes are refused while a user is being moved"""
+        ShardAssignment.objects.filter(user_id=self.user.pk) \
+            .update(frozen=True)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', res)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_move_user_shard(self):
+        """Test moving a user keeps their rows and ids"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=5)
+        recipe.tags.add(tag)
+
+        call_command('move_user_shard', self.user.email, 'default',
+                     '--no-wait', stdout=StringIO())
+
+        self.assertEqual(shard_for_user(self.user.pk), 'default')
+        self.assertFalse(Tag.objects.using('shard1').exists())
+        self.assertFalse(get_user_model().objects.using('shard1').exists())
+        moved = Recipe.objects.using('default').get()
+        self.assertEqual((moved.pk, moved.created_at),
+                         (recipe.pk, recipe.created_at))
+        self.assertEqual(list(moved.tags.all()), [tag])
+
+        res = self.client.post(RECIPES_URL, {
+            'title': 'Soup', 'time_minutes': 10, 'price': '2.00',
+            'tags': [tag.pk],
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.using('default').count(), 2)
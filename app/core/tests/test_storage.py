@@ -0,0 +1,94 @@
+import hashlib
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from core.models import ImageBlob, Recipe
+
+
+def sample_image(color='red'):
+    """Return the bytes of a small JPEG"""
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test recipe images are stored once and counted"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+
+    def sample_recipe(self, data):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5)
+        recipe.image = SimpleUploadedFile('photo.JPG', data)
+        recipe.save()
+        return recipe
+
+    def refcount(self, name):
+        return ImageBlob.objects.filter(name=name) \
+            .values_list('refcount', flat=True).first()
+
+    def test_image_named_after_digest(self):
+        """Test the stored name is sharded by the sha256 of the content"""
+        data = sample_image()
+        digest = hashlib.sha256(data).hexdigest()
+
+        recipe = self.sample_recipe(data)
+        self.addCleanup(recipe.delete)
+
+        self.assertEqual(
+            recipe.image.name,
+            f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertEqual(self.refcount(recipe.image.name), 1)
+
+    def test_same_content_stored_once(self):
+        """Test the file outlives all but the last recipe using it"""
+        data = sample_image()
+        first = self.sample_recipe(data)
+        second = self.sample_recipe(data)
+        path = first.image.path
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.refcount(second.image.name), 1)
+
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(self.refcount(second.image.name))
+
+    def test_replaced_image_released(self):
+        """Test replacing an image releases the previous one"""
+        recipe = self.sample_recipe(sample_image('red'))
+        self.addCleanup(recipe.delete)
+        old_path = recipe.image.path
+
+        # loaded fresh, like a recipe in a request
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        recipe.image = SimpleUploadedFile('new.jpg', sample_image('blue'))
+        recipe.save()
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recipe.image.path))
+        self.assertEqual(ImageBlob.objects.count(), 1)
+
+    def test_save_without_image_change_keeps_count(self):
+        """Test saving other fields leaves the count alone"""
+        recipe = self.sample_recipe(sample_image())
+        self.addCleanup(recipe.delete)
+
+        recipe = Recipe.objects.defer('image').get(pk=recipe.pk)
+        recipe.title = 'Stew'
+        recipe.save()
+
+        self.assertEqual(self.refcount(recipe.image.name), 1)
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.timing import fingerprint
+
+TAGS_URL = reverse('recipe:tag-list')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+TIMING = {
+    'SAMPLE_RATE': 1,
+    'SLOW_MS': 10000,
+    'TOP_QUERIES': 5,
+    'HEADER': True,
+}
+
+
+def metrics(response):
+    """Return {name: params} of a Server-Timing header"""
+    parsed = {}
+    for metric in response['Server-Timing'].split(', '):
+        name, *params = metric.split(';')
+        parsed[name] = dict(param.split('=', 1) for param in params)
+    return parsed
+
+
+@override_settings(SERVER_TIMING=TIMING)
+class ServerTimingTests(TestCase):
+    """Test requests are timed and slow ones logged"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_header(self):
+        """Test the queries and durations are sent as Server-Timing"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=5)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        res = self.client.get(RECIPES_URL)
+
+        timing = metrics(res)
+        self.assertRegex(timing['db']['desc'], r'^"[1-9]\d* queries"$')
+        self.assertIn('serialize', timing)
+        self.assertGreaterEqual(float(timing['total']['dur']),
+                                float(timing['db']['dur']))
+
+    def test_detail_serializer_timed(self):
+        """Test the serializers of other actions are timed too"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=5)
+
+        res = self.client.get(reverse('recipe:recipe-detail',
+                                      args=[recipe.pk]))
+
+        self.assertIn('serialize', metrics(res))
+
+    @override_settings(SERVER_TIMING=dict(TIMING, SAMPLE_RATE=0))
+    def test_not_sampled(self):
+        """Test requests left out of the sample are not timed"""
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(SERVER_TIMING=dict(TIMING, HEADER=False, SLOW_MS=0))
+    def test_slow_request_logged(self):
+        """Test slow requests are logged with their statements"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.assertLogs('core.timing', 'WARNING') as logs:
+            res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(f'GET {TAGS_URL} 200', logs.output[0])
+        self.assertIn('"core_tag"', logs.output[0])
+
+    def test_fingerprint(self):
+        """Test statements differing only in values fingerprint the same"""
+        self.assertEqual(
+            fingerprint('SELECT  * FROM t1 WHERE id IN (%s, %s, %s)\n'
+                        "AND name = 'x''y' LIMIT 21"),
+            'SELECT * FROM t1 WHERE id IN (...) AND name = ? LIMIT ?')
+        self.assertEqual(fingerprint('SELECT 1 WHERE a IN (%s, %s)'),
+                         fingerprint('SELECT 2 WHERE a IN (%s, %s, %s, %s)'))
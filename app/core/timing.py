@@ -0,0 +1,164 @@
+import logging
+import random
+import re
+import threading
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# the timing of the current request, None when it is not sampled
+_state = threading.local()
+
+# quoted strings and numbers, the statements Django sends use placeholders
+# but raw SQL may not
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# IN (%s, %s, ...) of any length
+LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Return sql with its literals and placeholder lists collapsed, so
+    statements differing only in their values group together"""
+    sql = LITERAL_RE.sub('?', sql).replace('%s', '?')
+    return SPACE_RE.sub(' ', LIST_RE.sub('(...)', sql)).strip()
+
+
+class RequestTiming:
+    """Queries and durations of one request, installed on every connection
+    with connection.execute_wrapper"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        # {name: seconds} of the blocks run in measure()
+        self.metrics = {}
+        # {sql: [count, seconds]}, only fingerprinted for the slow log
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - start
+            self.queries += 1
+            self.db += elapsed
+            stats = self.statements.get(sql)
+            if stats is None:
+                self.statements[sql] = [1, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+
+    def add(self, name, seconds):
+        self.metrics[name] = self.metrics.get(name, 0) + seconds
+
+    def top_statements(self, limit):
+        """Return (fingerprint, count, seconds) of the statements that took
+        longest in total"""
+        grouped = {}
+        for sql, (count, seconds) in self.statements.items():
+            stats = grouped.setdefault(fingerprint(sql), [0, 0.0])
+            stats[0] += count
+            stats[1] += seconds
+        return sorted(((sql, count, seconds) for sql, (count, seconds)
+                       in grouped.items()), key=lambda row: -row[2])[:limit]
+
+    def header(self, total):
+        """Return the Server-Timing header value"""
+        metrics = [f'db;dur={self.db * 1000:.1f};desc="{self.queries} '
+                   f'queries"']
+        metrics.extend(f'{name};dur={seconds * 1000:.1f}'
+                       for name, seconds in self.metrics.items())
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def measure(name):
+    """Add the time spent in the block to metric name of the request"""
+    timing = getattr(_state, 'timing', None)
+    if timing is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, perf_counter() - start)
+
+
+def timed(name, function):
+    """Wrap function to run in measure(name)"""
+    def wrapper(*args, **kwargs):
+        with measure(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class ServerTimingMixin:
+    """Time the serializers of a view as the serialize metric"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if getattr(_state, 'timing', None) is not None:
+            # Serializer.data calls self.to_representation, the instance
+            # attribute wins over the method
+            serializer.to_representation = timed(
+                'serialize', serializer.to_representation)
+        return serializer
+
+
+class ServerTimingMiddleware:
+    """Count the queries and time the database, serializers and the whole
+    of sampled requests
+
+    A SERVER_TIMING['SAMPLE_RATE'] share of requests is timed, the others
+    only cost a random number. Timed requests get a Server-Timing header
+    (browsers show it in their network tab) and are logged to core.timing
+    with their slowest statements when they took longer than SLOW_MS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = settings.SERVER_TIMING
+        if random.random() >= options['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        timing = _state.timing = RequestTiming()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _state.timing = None
+        total = perf_counter() - start
+
+        if options['HEADER']:
+            existing = response.get('Server-Timing')
+            response['Server-Timing'] = timing.header(total) if not \
+                existing else f'{existing}, {timing.header(total)}'
+        if total * 1000 >= options['SLOW_MS']:
+            self.log(request, response, timing, total,
+                     options['TOP_QUERIES'])
+        return response
+
+    def log(self, request, response, timing, total, limit):
+        lines = ''.join(
+            f'\n  {seconds * 1000:8.1f}ms {count:4}x {sql[:300]}'
+            for sql, count, seconds in timing.top_statements(limit))
+        metrics = ''.join(f', {name} {seconds * 1000:.1f}ms'
+                          for name, seconds in timing.metrics.items())
+        logger.warning(
+            'Slow request %s %s %s in %.1fms: %s queries %.1fms%s%s',
+            request.method, request.get_full_path(), response.status_code,
+            total * 1000, timing.queries, timing.db * 1000, metrics, lines)
@@ -0,0 +1,187 @@
+from django.db import connections, transaction
+from django.utils import timezone
+from rest_framework import serializers as drf_serializers
+
+from core.models import Ingredient, Recipe, Tag, normalize_name
+from core.search import update_search_vectors
+from core.sharding import shard_for_user
+from recipe.cache import get_response_cache
+from recipe.serializers import RecipeBatchItemSerializer
+
+# (relation name, related model, through table column) of the recipe M2Ms
+RELATIONS = (
+    ('tags', Tag, 'tag_id'),
+    ('ingredients', Ingredient, 'ingredient_id'),
+)
+
+# rows per INSERT and recipes per search document rebuild, keeps every
+# statement well below the bind parameter limits of the databases
+BATCH_SIZE = 1000
+
+
+def validate_recipe_batch(user, items):
+    """Validate a batch of recipes, return (validated items, errors)
+
+    errors holds one dict per item, empty for valid items. Related ids
+    and the recipes to update are checked with one query per table for
+    the whole batch instead of one per item.
+    """
+    # reuse one serializer per kind so the fields are only built once
+    create = RecipeBatchItemSerializer()
+    update = RecipeBatchItemSerializer(partial=True)
+
+    validated = []
+    errors = []
+    for item in items:
+        serializer = update if isinstance(item, dict) and 'id' in item \
+            else create
+        try:
+            validated.append(serializer.run_validation(item))
+            errors.append({})
+        except drf_serializers.ValidationError as exc:
+            validated.append(None)
+            errors.append(exc.detail)
+
+    owned = {}
+    for name, model, _ in RELATIONS:
+        wanted = {pk for data in validated if data
+                  for pk in data.get(name, ())}
+        owned[name] = set(model.objects.filter(user=user, pk__in=wanted)
+                          .values_list('id', flat=True))
+    wanted = {data['id'] for data in validated if data and 'id' in data}
+    owned['id'] = set(Recipe.objects.filter(user=user, pk__in=wanted)
+                      .values_list('id', flat=True))
+
+    # a second update of the same recipe would insert its links twice
+    seen = set()
+    for data, item_errors in zip(validated, errors):
+        if not data:
+            continue
+        if 'id' in data and data['id'] not in owned['id']:
+            item_errors['id'] = ['Recipe not found.']
+        elif 'id' in data and data['id'] in seen:
+            item_errors['id'] = ['Recipe appears more than once in the '
+                                 'batch.']
+        elif 'id' in data:
+            seen.add(data['id'])
+        for name, _, _ in RELATIONS:
+            missing = [pk for pk in data.get(name, ())
+                       if pk not in owned[name]]
+            if missing:
+                item_errors[name] = [f'Invalid pk "{pk}" - object does not '
+                                     'exist.' for pk in missing]
+
+    return validated, errors
+
+
+def save_recipe_batch(user, validated):
+    """Write validated recipes in one transaction
+
+    Returns the id of every recipe, in the order of validated.
+    """
+    creates = [data for data in validated if 'id' not in data]
+    updates = [data for data in validated if 'id' in data]
+    # the queries below are routed to the same shard, see core.routers
+    using = shard_for_user(user.pk)
+
+    with transaction.atomic(using=using):
+        created = iter(_create_recipes(user, creates))
+        # pair every item with its recipe id, in the order of the batch
+        pairs = [(data['id'] if 'id' in data else next(created).pk, data)
+                 for data in validated]
+
+        now = timezone.now()
+        for data in updates:
+            fields = {key: value for key, value in data.items()
+                      if key not in ('id', 'tags', 'ingredients')}
+            # update() skips auto_now and signals, both are handled here
+            Recipe.objects.filter(pk=data['id']).update(
+                updated_at=now, **fields)
+
+        for name, _, column in RELATIONS:
+            through = getattr(Recipe, name).through
+            # like a PUT, given relations replace the current ones
+            replaced = [data['id'] for data in updates if name in data]
+            through.objects.filter(recipe_id__in=replaced).delete()
+            # dict.fromkeys drops repeated ids but keeps the order
+            rows = [through(recipe_id=recipe_id, **{column: pk})
+                    for recipe_id, data in pairs
+                    for pk in dict.fromkeys(data.get(name, ()))]
+            through.objects.using(using).bulk_create(
+                rows, batch_size=_batch_size(through, rows, using))
+
+        ids = [recipe_id for recipe_id, _ in pairs]
+        for start in range(0, len(ids), BATCH_SIZE):
+            update_search_vectors(ids[start:start + BATCH_SIZE], using)
+
+    # bulk writes send no signals
+    get_response_cache().invalidate_user(user.pk)
+    return ids
+
+
+def get_or_create_names(model, user, names):
+    """Return {name: id} of the user's tags or ingredients, creating any
+    that are missing
+
+    Names are matched once normalized. Existing rows are read with one
+    query per BATCH_SIZE names, the rest are inserted together and read
+    back, a concurrent insert of the same name is skipped by the unique
+    constraint instead of failing the request.
+    """
+    normalized = {name: normalize_name(name) for name in names}
+    wanted = sorted(set(normalized.values()))
+
+    ids = _name_ids(model, user, wanted)
+    missing = [name for name in wanted if name not in ids]
+    if missing:
+        rows = [model(user=user, name=name) for name in missing]
+        using = shard_for_user(user.pk)
+        model.objects.using(using).bulk_create(
+            rows, batch_size=_batch_size(model, rows, using),
+            ignore_conflicts=True)
+        ids.update(_name_ids(model, user, missing))
+        # bulk writes send no signals
+        get_response_cache().invalidate_user(user.pk)
+
+    return {name: ids[normal] for name, normal in normalized.items()}
+
+
+def _name_ids(model, user, names):
+    """Return {name: id} of the given names the user has"""
+    ids = {}
+    for start in range(0, len(names), BATCH_SIZE):
+        ids.update(model.objects.filter(
+            user=user, name__in=names[start:start + BATCH_SIZE])
+            .values_list('name', 'id'))
+    return ids
+
+
+def _create_recipes(user, creates):
+    """Insert new recipes, return the saved instances in order"""
+    recipes = [
+        Recipe(user=user, **{key: value for key, value in data.items()
+                             if key not in ('tags', 'ingredients')})
+        for data in creates
+    ]
+    using = shard_for_user(user.pk)
+    if connections[using].features.can_return_ids_from_bulk_insert:
+        return Recipe.objects.using(using).bulk_create(
+            recipes, batch_size=_batch_size(Recipe, recipes, using))
+
+    # without RETURNING the new ids are unknown, save one at a time
+    for recipe in recipes:
+        # save_recipe_batch rebuilds every search document at the end
+        recipe._defer_search_vector = True
+        recipe.save()
+    return recipes
+
+
+def _batch_size(model, objs, using):
+    """Return how many rows of model to insert per statement on using"""
+    # Django 2.1 does not cap an explicit batch_size to what the backend
+    # supports (SQLite allows 999 parameters per statement)
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    return max(1, min(
+        BATCH_SIZE,
+        connections[using].ops.bulk_batch_size(fields, objs)))
@@ -0,0 +1,176 @@
+import hashlib
+import pickle
+import uuid
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import LRUCache
+
+
+class LocMemBackend:
+    """Per process LRU store, evicts once MAX_ENTRIES or MAX_BYTES is hit"""
+
+    def __init__(self, options):
+        self._cache = LRUCache(
+            max_entries=options.get('MAX_ENTRIES', 10000),
+            max_bytes=options.get('MAX_BYTES'),
+        )
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, timeout):
+        self._cache.set(key, value, timeout)
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class RedisBackend:
+    """Store shared by every process, anything speaking the redis API works"""
+
+    def __init__(self, options, client=None):
+        if client is None:
+            # only needed when this backend is configured
+            import redis
+            client = redis.Redis.from_url(options['LOCATION'])
+        self.client = client
+        self.prefix = options.get('KEY_PREFIX', 'recipe-api')
+
+    def get(self, key):
+        return self.client.get(f'{self.prefix}:{key}')
+
+    def set(self, key, value, timeout):
+        self.client.set(f'{self.prefix}:{key}', value, ex=timeout)
+
+    def delete(self, key):
+        self.client.delete(f'{self.prefix}:{key}')
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}:*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """Cache of serialized API responses, scoped per user
+
+    Every key embeds a generation token for the user. Any write to the
+    user's recipes, tags or ingredients replaces the token (see
+    recipe.signals), so all of that user's entries become unreachable at
+    once and age out of the backend.
+    """
+
+    def __init__(self, backend, timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, user_id):
+        """Return the current generation token of a user"""
+        key = f'generation:{user_id}'
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = self.invalidate_user(user_id)
+        elif isinstance(generation, bytes):
+            generation = generation.decode()
+        return generation
+
+    def invalidate_user(self, user_id):
+        """Drop every cached response of a user"""
+        # a random token instead of a counter so a restarted process or an
+        # evicted generation can never bring back an old key
+        generation = uuid.uuid4().hex
+        self.backend.set(f'generation:{user_id}', generation, None)
+        return generation
+
+    def key(self, request, view):
+        """Return the cache key of a request to view"""
+        generation = self.generation(request.user.pk)
+        url = hashlib.md5(
+            request.build_absolute_uri().encode()).hexdigest()
+        return (f'response:{request.user.pk}:{generation}:'
+                f'{view.basename}:{view.action}:{url}')
+
+    def get(self, key):
+        """Return the cached response data for key or None"""
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, key, data):
+        """Cache the response data under key"""
+        self.backend.set(
+            key, pickle.dumps(data, pickle.HIGHEST_PROTOCOL), self.timeout)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Return the hit and miss counters of this process"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """Return the response cache configured in RECIPE_RESPONSE_CACHE"""
+    global _response_cache
+    if _response_cache is None:
+        options = settings.RECIPE_RESPONSE_CACHE
+        backend = import_string(options['BACKEND'])(options)
+        _response_cache = ResponseCache(
+            backend, timeout=options.get('TIMEOUT', 300))
+    return _response_cache
+
+
+@receiver(setting_changed)
+def reset_response_cache(setting, **kwargs):
+    """Rebuild the cache when tests override its settings"""
+    global _response_cache
+    if setting == 'RECIPE_RESPONSE_CACHE':
+        _response_cache = None
+
+
+class CachedResponseMixin:
+    """Serve list responses from the response cache"""
+
+    # detail viewsets wrap retrieve with read_response themselves, defining
+    # it here would make the router add detail routes to list only viewsets
+    def list(self, request, *args, **kwargs):
+        return self.read_response(super().list, request, *args, **kwargs)
+
+    def read_response(self, handler, request, *args, **kwargs):
+        """Return the cached response or build it with handler"""
+        cache = get_response_cache()
+        key = cache.key(request, self)
+        data = cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
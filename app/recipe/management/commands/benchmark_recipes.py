@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import Ingredient, Tag
+from core.sharding import for_user
+from recipe.views import RecipeViewSet
+
+
+class Command(BaseCommand):
+    """Django command to time recipe list requests against seeded data"""
+    help = 'Benchmark the recipe list endpoint, run seed_recipes first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='bench@londonappdev.com')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f'No user {options["email"]}, '
+                               'run seed_recipes first')
+        self.user = user
+        self.repeat = options['repeat']
+
+        with for_user(user.pk) as self.shard:
+            tag_ids = list(Tag.objects.filter(user=user)
+                           .values_list('id', flat=True)[:2])
+            ingredient_id = Ingredient.objects.filter(user=user) \
+                .values_list('id', flat=True).first()
+        cases = [
+            ('unfiltered', {}),
+            ('tags', {'tags': ','.join(map(str, tag_ids))}),
+            ('ingredients', {'ingredients': ingredient_id}),
+            ('tags+ingredients', {'tags': tag_ids[0],
+                                  'ingredients': ingredient_id}),
+        ]
+        for name, params in cases:
+            self.report(name, self.time_list(params))
+
+    def time_list(self, params):
+        """Time repeated list requests, return durations and query count"""
+        view = RecipeViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        durations = []
+        for _ in range(self.repeat):
+            request = factory.get('/api/recipe/recipes/', params)
+            force_authenticate(request, user=self.user)
+            # the recipe queries run on the user's shard
+            with CaptureQueriesContext(connections[self.shard]) as queries:
+                start = time.perf_counter()
+                response = view(request)
+                response.render()
+                durations.append(time.perf_counter() - start)
+        return durations, len(queries)
+
+    def report(self, name, result):
+        """Write the median and worst request time of a case"""
+        durations, queries = result
+        self.stdout.write(
+            f'{name:<20} median {statistics.median(durations) * 1000:8.2f}ms '
+            f'max {max(durations) * 1000:8.2f}ms  {queries} queries')
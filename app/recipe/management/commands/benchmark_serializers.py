@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+from core.sharding import for_user
+from recipe.serializers import RecipeSerializer
+from recipe.values import values_serializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the recipe list serializers"""
+    help = ('Time RecipeSerializer against the values() path on seeded '
+            'recipes, run seed_recipes first')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='bench@londonappdev.com')
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            raise CommandError(f'No user {options["email"]}, '
+                               'run seed_recipes first')
+        # the queries below go to the user's shard
+        with for_user(user.pk):
+            # the newest recipes, like the first page of a very long list
+            queryset = Recipe.objects.filter(user=user) \
+                .order_by('-id')[:options['recipes']]
+
+            cases = [
+                ('ModelSerializer', lambda: self.model_serializer(queryset)),
+                ('values()', lambda: self.values_serializer(queryset)),
+            ]
+            rendered = {}
+            for name, render in cases:
+                durations = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    rendered[name] = render()
+                    durations.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f'{name:<16} {options["recipes"]} recipes median '
+                    f'{statistics.median(durations) * 1000:8.2f}ms '
+                    f'max {max(durations) * 1000:8.2f}ms')
+
+        if len(set(rendered.values())) != 1:
+            raise CommandError('The serializers rendered different output')
+        self.stdout.write(self.style.SUCCESS('Output is identical'))
+
+    def model_serializer(self, queryset):
+        """Render the recipes through RecipeSerializer"""
+        # ordered like the values() path renders related ids
+        queryset = queryset.prefetch_related(
+            Prefetch('ingredients', Ingredient.objects.order_by('id')),
+            Prefetch('tags', Tag.objects.order_by('id')),
+        )
+        return JSONRenderer().render(
+            RecipeSerializer(queryset, many=True).data)
+
+    def values_serializer(self, queryset):
+        """Render the recipes from values() rows"""
+        serializer = values_serializer(RecipeSerializer)
+        return JSONRenderer().render(
+            serializer.to_representation(serializer.values(queryset)))
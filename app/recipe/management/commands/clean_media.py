@@ -0,0 +1,164 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.models import ImageBlob, Recipe
+from recipe.thumbnails import original_stem
+from recipe.uploads import PARTIAL_DIR
+
+
+class Command(BaseCommand):
+    """Django command to remove media files no recipe uses"""
+    help = 'Delete or quarantine recipe images no recipe refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default='uploads/recipe',
+                            help='Media directory to walk')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be removed')
+        parser.add_argument('--quarantine',
+                            help='Move orphans under this directory instead '
+                                 'of deleting them')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Files looked up per query')
+        parser.add_argument('--max-rate', type=float, default=0,
+                            help='Files removed per second, 0 for no limit')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Seconds since a file was written before '
+                                 'it may be removed')
+        parser.add_argument('--partial-age', type=int, default=24 * 60 * 60,
+                            help='Seconds an unfinished upload is kept')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        self.options = options
+        self.media_root = default_storage.path('')
+        self.removed = 0
+        self.started = time.monotonic()
+        self.partial_dir = default_storage.path(PARTIAL_DIR)
+
+        scanned = 0
+        for directory, entries in self.walk(default_storage.path(
+                options['root'])):
+            scanned += len(entries)
+            if directory == self.partial_dir:
+                self.clean_partial(entries)
+            else:
+                self.clean_directory(entries)
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files. {verb} {self.removed} orphans.'))
+
+    def walk(self, root):
+        """Yield (directory, file entries) of every directory under root"""
+        # one directory in memory at a time, the sharded layout of
+        # core.storage keeps each of them small
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as scan:
+                    entries = []
+                    for entry in scan:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            entries.append(entry)
+            except FileNotFoundError:
+                continue
+            yield directory, entries
+
+    def is_old(self, entry, age):
+        return entry.stat().st_mtime < time.time() - age
+
+    def clean_partial(self, entries):
+        """Remove uploads nobody finished"""
+        self.remove([entry for entry in entries
+                     if self.is_old(entry, self.options['partial_age'])])
+
+    def clean_directory(self, entries):
+        """Remove unused images of one directory and their sizes"""
+        originals = []
+        derivatives = []
+        for entry in entries:
+            stem = original_stem(entry.name)
+            if stem is None:
+                originals.append(entry)
+            else:
+                derivatives.append((entry, stem))
+
+        removed = set()
+        batch_size = self.options['batch_size']
+        for start in range(0, len(originals), batch_size):
+            batch = [entry for entry in originals[start:start + batch_size]
+                     if self.is_old(entry, self.options['min_age'])]
+            orphans = self.unreferenced(batch)
+            self.remove(orphans)
+            removed.update(entry.name for entry in orphans)
+
+        # a size outlives its original only until the next run
+        kept = {os.path.splitext(entry.name)[0] for entry in originals
+                if entry.name not in removed}
+        self.remove([entry for entry, stem in derivatives
+                     if stem not in kept and
+                     self.is_old(entry, self.options['min_age'])])
+
+    def unreferenced(self, entries):
+        """Return the entries no recipe uses"""
+        names = {self.media_name(entry): entry for entry in entries}
+        # image blobs are indexed by name, only the files they do not count
+        # are looked for in the recipe table
+        used = set(ImageBlob.objects.filter(
+            name__in=list(names), refcount__gt=0)
+            .values_list('name', flat=True))
+        candidates = [name for name in names if name not in used]
+        # recipes of every shard share the media root
+        for shard in settings.DATABASE_SHARDS['SHARDS']:
+            if not candidates:
+                break
+            found = set(Recipe.objects.using(shard)
+                        .filter(image__in=candidates)
+                        .values_list('image', flat=True))
+            used.update(found)
+            candidates = [name for name in candidates if name not in found]
+        return [entry for name, entry in names.items() if name not in used]
+
+    def media_name(self, entry):
+        """Return the storage name of a file, as stored in Recipe.image"""
+        return os.path.relpath(entry.path, self.media_root) \
+            .replace(os.sep, '/')
+
+    def remove(self, entries):
+        """Delete or quarantine files, at most --max-rate per second"""
+        for entry in entries:
+            self.throttle()
+            self.removed += 1
+            name = self.media_name(entry)
+            if self.options['verbosity'] > 1 or self.options['dry_run']:
+                self.stdout.write(name)
+            if self.options['dry_run']:
+                continue
+
+            if self.options['quarantine']:
+                target = os.path.join(self.options['quarantine'], name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(entry.path, target)
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            ImageBlob.objects.filter(name=name, refcount=0).delete()
+
+    def throttle(self):
+        """Sleep while removing faster than --max-rate"""
+        rate = self.options['max_rate']
+        if rate:
+            ahead = self.removed / rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
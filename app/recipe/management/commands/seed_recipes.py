@@ -0,0 +1,91 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Ingredient, Recipe, Tag
+from core.sharding import for_user
+
+
+class Command(BaseCommand):
+    """Django command to seed a user with a large recipe dataset"""
+    help = 'Create a user owning many recipes, tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='bench@londonappdev.com')
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--per-recipe', type=int, default=3,
+                            help='Tags and ingredients linked to each recipe')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        rand = random.Random(options['seed'])
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            user = get_user_model().objects.create_user(
+                options['email'], None, name='Benchmark user')
+
+        # the queries below go to the user's shard
+        with for_user(user.pk) as shard:
+            tag_ids = self.create_attrs(Tag, user, options['tags'])
+            ingredient_ids = self.create_attrs(
+                Ingredient, user, options['ingredients'])
+
+            created = 0
+            while created < options['recipes']:
+                size = min(options['batch_size'],
+                           options['recipes'] - created)
+                with transaction.atomic(using=shard):
+                    self.create_batch(user, created, size, tag_ids,
+                                      ingredient_ids, options['per_recipe'],
+                                      rand)
+                created += size
+                self.stdout.write(f'{created} recipes created')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {created} recipes for {user.email}'))
+
+    def create_attrs(self, model, user, count):
+        """Make sure the user has count tags or ingredients, return the ids"""
+        existing = model.objects.filter(user=user).count()
+        model.objects.bulk_create(
+            model(user=user, name=f'{model.__name__} {number}')
+            for number in range(existing, count))
+        return list(model.objects.filter(user=user)
+                    .values_list('id', flat=True))
+
+    def create_batch(self, user, offset, size, tag_ids, ingredient_ids,
+                     per_recipe, rand):
+        """Create one batch of recipes along with their through rows"""
+        last_id = Recipe.objects.filter(user=user).order_by('-id') \
+            .values_list('id', flat=True).first() or 0
+        Recipe.objects.bulk_create(
+            Recipe(user=user,
+                   title=f'Recipe {offset + number}',
+                   time_minutes=rand.randint(5, 180),
+                   price=rand.randint(100, 9999) / 100)
+            for number in range(size))
+        # not every database returns ids from a bulk insert so read them back
+        recipe_ids = Recipe.objects.filter(user=user, id__gt=last_id) \
+            .values_list('id', flat=True)
+
+        tags_per_recipe = min(per_recipe, len(tag_ids))
+        ingredients_per_recipe = min(per_recipe, len(ingredient_ids))
+        tag_rows = []
+        ingredient_rows = []
+        for recipe_id in recipe_ids:
+            tag_rows.extend(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for tag_id in rand.sample(tag_ids, tags_per_recipe))
+            ingredient_rows.extend(
+                Recipe.ingredients.through(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id)
+                for ingredient_id in rand.sample(
+                    ingredient_ids, ingredients_per_recipe))
+        Recipe.tags.through.objects.bulk_create(tag_rows)
+        Recipe.ingredients.through.objects.bulk_create(ingredient_rows)
@@ -0,0 +1,149 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from core.sharding import shard_for_user
+from recipe.thumbnails import original_stem
+from user.authentication import CachedTokenAuthentication
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read only the bytes start to end of a file"""
+
+    def __init__(self, file, start, end):
+        file.seek(start)
+        self.file = file
+        self.remaining = end - start + 1
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) of a single byte range, None to send it all
+
+    Raises ValueError when the range lies outside the file.
+    """
+    match = RANGE_RE.match(header or '')
+    # several ranges or another unit, sending the whole file is allowed
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # bytes=-500 is the last 500 bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+class MediaView(APIView):
+    """Serve a recipe image to a user owning a recipe that uses it
+
+    Names never change content (see core.storage), so responses are
+    cached for good. With MEDIA_DELIVERY['SENDFILE_HEADER'] set, the front
+    end server sends the bytes, otherwise they are streamed from here.
+    """
+    authentication_classes = (CachedTokenAuthentication,
+                              SessionAuthentication)
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request, name):
+        try:
+            path = safe_join(settings.MEDIA_ROOT, name)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not self.is_readable(request.user, name) or \
+                not os.path.isfile(path):
+            raise Http404
+
+        stat = os.stat(path)
+        etag = quote_etag(hashlib.md5(
+            f'{name}:{stat.st_size}'.encode()).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            response = self.send_file(request, name, path, stat.st_size, etag)
+
+        options = settings.MEDIA_DELIVERY
+        # private, a shared cache must not hand the file to other users
+        response['Cache-Control'] = \
+            f'private, max-age={options["MAX_AGE"]}, immutable'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+    def is_readable(self, user, name):
+        """Return True if one of the user's recipes uses the file"""
+        stem = original_stem(name)
+        recipes = Recipe.objects.using(shard_for_user(user.pk))
+        if stem is not None:
+            # the original of a derivative keeps its own extension
+            return recipes.filter(
+                user=user, image__startswith=f'{stem}.').exists()
+        return recipes.filter(user=user, image=name).exists()
+
+    def send_file(self, request, name, path, size, etag):
+        """Return the response carrying the bytes of the file"""
+        content_type = mimetypes.guess_type(path)[0] or \
+            'application/octet-stream'
+        header = settings.MEDIA_DELIVERY['SENDFILE_HEADER']
+        if header == 'X-Accel-Redirect':
+            # nginx serves an internal location aliased to MEDIA_ROOT and
+            # answers range requests itself
+            response = HttpResponse(content_type=content_type)
+            response[header] = \
+                settings.MEDIA_DELIVERY['ACCEL_PREFIX'] + name
+            return response
+        if header:
+            response = HttpResponse(content_type=content_type)
+            response[header] = path
+            return response
+
+        byte_range = None
+        # If-Range: only send part of the file if it is the same version
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = parse_range(
+                    request.META.get('HTTP_RANGE'), size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(
+                open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(
+                RangeFile(open(path, 'rb'), start, end), status=206,
+                content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+        return response
@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+# keyset pagination, each page seeks from the last row of the previous page
+# so deep pages cost the same as the first one and no COUNT(*) is ever run
+# https://www.django-rest-framework.org/api-guide/pagination/#cursorpagination
+class RecipeCursorPagination(CursorPagination):
+    """Paginate recipes newest first"""
+    ordering = ('-id', )
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """Use the ordering of the view if it picks one for this request"""
+        get_view_ordering = getattr(view, 'get_pagination_ordering', None)
+        ordering = get_view_ordering() if get_view_ordering else None
+        return ordering or super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Paginate tags and ingredients by name"""
+    # id breaks ties between rows with the same name
+    ordering = ('-name', 'id')
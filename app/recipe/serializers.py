@@ -1,9 +1,29 @@
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
-
-
-class TagSerializer(serializers.ModelSerializer):
+from core.models import Tag, Ingredient, Recipe, normalize_name
+from recipe.thumbnails import derivative_urls
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for tags and ingredients, unique by name per user"""
+
+    def validate_name(self, value):
+        """Normalize the name and reject one the user already has"""
+        name = normalize_name(value)
+        request = self.context.get('request')
+        if request is not None:
+            existing = self.Meta.model.objects.filter(
+                user=request.user, name=name)
+            if self.instance is not None:
+                existing = existing.exclude(pk=self.instance.pk)
+            if existing.exists():
+                raise serializers.ValidationError(
+                    f'{self.Meta.model._meta.verbose_name} "{name}" '
+                    'already exists.')
+        return name
+
+
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for tag object"""
 
     class Meta:
@@ -15,7 +35,7 @@ class TagSerializer(serializers.ModelSerializer):
 # ingredient serialzers
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for Ingredients"""
 
     class Meta:
@@ -24,6 +44,34 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_Fields = ('id', )
 
 
+class RecipeAttrBulkSerializer(serializers.Serializer):
+    """Names of the tags or ingredients to get or create"""
+    # untrimmed so the response is keyed by the names as they were sent
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255, trim_whitespace=False),
+        allow_empty=False)
+
+    def validate_names(self, value):
+        if not all(normalize_name(name) for name in value):
+            raise serializers.ValidationError('Names may not be blank.')
+        return value
+
+
+class ImageDerivativesField(serializers.Field):
+    """URLs of the downscaled copies of a recipe image, keyed by size"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        # a FieldFile from a recipe or the stored name from values()
+        name = getattr(value, 'name', value)
+        if not name:
+            return None
+        return derivative_urls(name)
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serialize a recipe"""
     # what this does for MTM fields to list only PK of the
@@ -31,6 +79,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True, queryset=Ingredient.objects.all())
     tags = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all())
+    images = ImageDerivativesField(source='image')
 
     class Meta:
         model = Recipe
@@ -42,6 +91,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'time_minutes',
             'price',
             'link',
+            'images',
         )
         read_only_fields = ('id', )
         # prevent PK from changing
@@ -56,9 +106,33 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to recipe"""
+    images = ImageDerivativesField(source='image')
 
     class Meta:
         model = Recipe
         # only to accept image field for this serializer
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'images')
         read_only_fields = ('id', )
+
+
+class RecipeBatchItemSerializer(serializers.ModelSerializer):
+    """Validate one recipe of a batch without touching the database"""
+    # items with an id update that recipe, the others are created
+    id = serializers.IntegerField(required=False)
+    # the ids are checked for the whole batch at once in recipe.bulk
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id',
+            'title',
+            'ingredients',
+            'tags',
+            'time_minutes',
+            'price',
+            'link',
+        )
@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag
+from core.search import update_search_vectors
+from recipe.cache import get_response_cache
+from recipe.thumbnails import delete_derivatives
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner_responses(sender, instance, **kwargs):
+    """Drop the cached responses of the owner of a changed object"""
+    get_response_cache().invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_relation_responses(sender, instance, action, **kwargs):
+    """Drop the cached responses when through table rows change"""
+    # instance is the recipe, or the tag/ingredient for reverse changes,
+    # either way it belongs to the user whose responses are stale
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        get_response_cache().invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_relinked_recipes(sender, instance, action, reverse, pk_set, using,
+                            **kwargs):
+    """Refresh recipes whose tags or ingredients changed"""
+    if reverse:
+        # instance is the tag or ingredient, remember which recipes lose it
+        # before a clear since pk_set is not given for clears
+        if action == 'pre_clear':
+            instance._cleared_recipe_ids = list(
+                instance.recipe_set.values_list('id', flat=True))
+            return
+        if action == 'post_clear':
+            pk_set = instance.__dict__.pop('_cleared_recipe_ids', [])
+        recipe_ids = list(pk_set or [])
+    else:
+        recipe_ids = [instance.pk]
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        # update() skips post_save, the cache is already invalidated above
+        Recipe.objects.using(using).filter(pk__in=recipe_ids) \
+            .update(updated_at=timezone.now())
+        update_search_vectors(recipe_ids, using)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, using, **kwargs):
+    """Rebuild the search document after the title may have changed"""
+    # batch writers rebuild the documents of all their rows at once
+    if not getattr(instance, '_defer_search_vector', False):
+        update_search_vectors([instance.pk], using)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_stored_image(sender, instance, using, **kwargs):
+    """Remember the image a save may replace"""
+    # set by Recipe.from_db unless the image column was deferred
+    if not hasattr(instance, '_stored_image'):
+        instance._stored_image = None if instance._state.adding else \
+            sender.objects.using(using).filter(pk=instance.pk) \
+            .values_list('image', flat=True).first() or None
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, **kwargs):
+    """Count a new image and release the one it replaced"""
+    stored = instance._stored_image
+    image = instance.image.name or None
+    if image == stored:
+        return
+    if image:
+        instance.image.storage.retain(image)
+    if stored:
+        release_image(instance.image.storage, stored)
+    instance._stored_image = image
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Release the image of a deleted recipe"""
+    stored = getattr(instance, '_stored_image', instance.image.name)
+    if stored:
+        release_image(instance.image.storage, stored)
+
+
+def release_image(storage, name):
+    """Drop a reference to an image, its sizes go with the last one"""
+    if storage.release(name):
+        delete_derivatives(name)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_recipes_of_deleted(sender, instance, **kwargs):
+    """Remember the recipes of a tag or ingredient about to be deleted"""
+    # the cascade removes the through rows without sending m2m_changed
+    instance._deleted_recipe_ids = list(
+        instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_recipes_of_renamed(sender, instance, using, created=False,
+                              **kwargs):
+    """Rebuild the search document of recipes using a changed name, and
+    bump the recipes that lost a deleted one"""
+    if created:
+        return
+    recipe_ids = instance.__dict__.pop('_deleted_recipe_ids', None)
+    if recipe_ids is None:
+        recipe_ids = instance.recipe_set.values_list('id', flat=True)
+    else:
+        # like update_relinked_recipes, their related ids changed
+        Recipe.objects.using(using).filter(pk__in=recipe_ids) \
+            .update(updated_at=timezone.now())
+    update_search_vectors(recipe_ids, using)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_responses(sender, instance, **kwargs):
+    """Start new users (and reused ids) from an empty cache"""
+    get_response_cache().invalidate_user(instance.pk)
@@ -0,0 +1,73 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ManyToManyField
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsMixin:
+    """Let read actions return a subset of fields
+
+    ?fields=id,title keeps only the given fields, ?omit=ingredients drops
+    them. The serializer is narrowed, the SELECT only reads the columns
+    of the fields left and relations nobody asked for are not loaded.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """Return the names of the requested fields, None for all of them"""
+        if self.action not in self.sparse_actions:
+            return None
+        params = self.request.query_params
+        fields = params.get('fields')
+        omit = params.get('omit')
+        if not fields and not omit:
+            return None
+
+        # kept in the order of the serializer so the output is stable
+        available = list(self.get_serializer_class().Meta.fields)
+        selected = available
+        for param, names in (('fields', fields), ('omit', omit)):
+            if not names:
+                continue
+            names = [name.strip() for name in names.split(',')
+                     if name.strip()]
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                raise ValidationError({param: [
+                    f'Unknown field "{name}".' for name in unknown]})
+            if param == 'fields':
+                selected = [name for name in selected if name in names]
+            else:
+                selected = [name for name in selected if name not in names]
+
+        if not selected:
+            raise ValidationError({'omit': ['No fields left to return.']})
+        return tuple(selected)
+
+    def only_sparse_fields(self, queryset):
+        """Defer the columns of the fields that were not requested"""
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        declared = self.get_serializer_class()().fields
+        columns = []
+        for name in fields:
+            try:
+                field = queryset.model._meta.get_field(declared[name].source)
+            except FieldDoesNotExist:
+                continue
+            # relations are loaded by prefetching, not by the SELECT
+            if not isinstance(field, ManyToManyField):
+                columns.append(field.name)
+        return queryset.only(queryset.model._meta.pk.name, *columns)
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer narrowed to the requested fields"""
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            # many=True wraps the serializer of a single object
+            declared = getattr(serializer, 'child', serializer).fields
+            for name in list(declared):
+                if name not in fields:
+                    declared.pop(name)
+        return serializer
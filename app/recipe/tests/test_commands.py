@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.models import ImageBlob, Recipe
+
+
+class CleanMediaTests(TestCase):
+    """Test removing media files no recipe uses"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+
+    def write(self, name, age=2 * 60 * 60):
+        """Write a file under the media root last modified age seconds ago"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(b'image')
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def call(self, *args):
+        out = StringIO()
+        call_command('clean_media', *args, stdout=out)
+        return out.getvalue()
+
+    def test_referenced_files_kept(self):
+        """Test images of recipes and their sizes are kept"""
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        original = self.write(name)
+        derivative = self.write('uploads/recipe/ab/cd/abcd__thumbnail.webp')
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5)
+        Recipe.objects.update(image=name)
+
+        self.call()
+
+        self.assertTrue(os.path.exists(original))
+        self.assertTrue(os.path.exists(derivative))
+
+    def test_orphans_removed(self):
+        """Test unused images, their sizes and blobs are deleted"""
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        original = self.write(name)
+        derivative = self.write('uploads/recipe/ab/cd/abcd__thumbnail.webp')
+        ImageBlob.objects.create(name=name, refcount=0)
+
+        out = self.call()
+
+        self.assertFalse(os.path.exists(original))
+        self.assertFalse(os.path.exists(derivative))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+        self.assertIn('Removed 2 orphans', out)
+
+    def test_counted_blob_kept(self):
+        """Test a file with references counted is not removed"""
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        original = self.write(name)
+        ImageBlob.objects.create(name=name, refcount=1)
+
+        self.call()
+
+        self.assertTrue(os.path.exists(original))
+
+    def test_recent_files_kept(self):
+        """Test files written recently may still be about to be used"""
+        original = self.write('uploads/recipe/ab/cd/abcd.jpg', age=60)
+
+        self.call()
+
+        self.assertTrue(os.path.exists(original))
+
+    def test_dry_run(self):
+        """Test dry run only lists the orphans"""
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        original = self.write(name)
+
+        out = self.call('--dry-run')
+
+        self.assertTrue(os.path.exists(original))
+        self.assertIn(name, out)
+        self.assertIn('Would remove 1 orphans', out)
+
+    def test_quarantine(self):
+        """Test orphans are moved keeping their path"""
+        name = 'uploads/recipe/ab/cd/abcd.jpg'
+        original = self.write(name)
+        quarantine = tempfile.TemporaryDirectory()
+        self.addCleanup(quarantine.cleanup)
+
+        self.call('--quarantine', quarantine.name)
+
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(os.path.exists(os.path.join(quarantine.name, name)))
+
+    def test_stale_partial_uploads_removed(self):
+        """Test unfinished uploads are removed after a day"""
+        stale = self.write('uploads/recipe/partial/recipe-1.part',
+                           age=2 * 24 * 60 * 60)
+        fresh = self.write('uploads/recipe/partial/recipe-2.part')
+
+        self.call()
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
@@ -0,0 +1,190 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetApiTests(TestCase):
+    """Test ETag and Last-Modified handling of the recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client.force_authenticate(self.user)
+
+    def test_list_has_validators(self):
+        """Test list responses carry an ETag and Last-Modified"""
+        sample_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.has_header('ETag'))
+        self.assertTrue(res.has_header('Last-Modified'))
+
+    def test_if_none_match_not_modified(self):
+        """Test a matching ETag is answered with a single query and a 304"""
+        sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_if_modified_since_not_modified(self):
+        """Test a current If-Modified-Since is answered with a 304"""
+        sample_recipe(user=self.user)
+        last_modified = self.client.get(RECIPES_URL)['Last-Modified']
+
+        res = self.client.get(
+            RECIPES_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_update(self):
+        """Test updating a recipe changes the list ETag"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+        recipe.title = 'Chicken tikka'
+        recipe.save()
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_etag_changes_on_delete(self):
+        """Test deleting a recipe changes the list ETag"""
+        sample_recipe(user=self.user)
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+        recipe.delete()
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_differs_per_page_and_filter(self):
+        """Test the query string is part of the ETag"""
+        sample_recipe(user=self.user)
+
+        res1 = self.client.get(RECIPES_URL)
+        res2 = self.client.get(RECIPES_URL, {'page_size': 1})
+
+        self.assertNotEqual(res1['ETag'], res2['ETag'])
+
+    def test_tag_added_bumps_recipe(self):
+        """Test adding a tag to a recipe updates its timestamp"""
+        recipe = sample_recipe(user=self.user)
+        updated_at = recipe.updated_at
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        recipe.refresh_from_db()
+
+        self.assertGreater(recipe.updated_at, updated_at)
+
+    def test_reverse_clear_bumps_recipe(self):
+        """Test clearing the recipes of a tag updates their timestamps"""
+        recipe = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        recipe.refresh_from_db()
+        updated_at = recipe.updated_at
+
+        tag.recipe_set.clear()
+        recipe.refresh_from_db()
+
+        self.assertGreater(recipe.updated_at, updated_at)
+
+    def test_etag_changes_on_tag_delete(self):
+        """Test deleting a tag changes the list ETag of its recipes"""
+        recipe = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        etag = self.client.get(RECIPES_URL)['ETag']
+        tag.delete()
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['results'][0]['tags'], [])
+
+    def test_detail_etag_changes_on_tag_rename(self):
+        """Test renaming a tag changes the ETag of recipes using it"""
+        recipe = sample_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+        tag.name = 'Vegetarian'
+        tag.save()
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_detail_not_modified(self):
+        """Test an unchanged recipe detail is answered with a 304"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_tags_not_modified(self):
+        """Test the tag list supports conditional requests too"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_assigned_only_etag_changes_on_relink(self):
+        """Test the assigned tags list changes when recipes swap tags"""
+        tag_a = Tag.objects.create(user=self.user, name='a')
+        tag_b = Tag.objects.create(user=self.user, name='b')
+        tag_c = Tag.objects.create(user=self.user, name='c')
+        recipe1 = sample_recipe(user=self.user)
+        recipe1.tags.add(tag_a)
+        sample_recipe(user=self.user).tags.add(tag_c)
+        etag = self.client.get(TAGS_URL, {'assigned_only': 1})['ETag']
+        recipe1.tags.remove(tag_a)
+        recipe1.tags.add(tag_b)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1},
+                              HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['c', 'b'])
+
+    def test_detail_invalid_id(self):
+        """Test a malformed recipe id is not found"""
+        res = self.client.get(detail_url('abc'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,135 @@
+from io import BytesIO
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.thumbnails import derivative_name
+
+
+def media_url(name):
+    return f'/media/{name}'
+
+
+class MediaViewTests(TestCase):
+    """Test serving recipe images"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8)).save(buffer, format='PNG')
+        self.data = buffer.getvalue()
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=5,
+            image=SimpleUploadedFile('soup.png', self.data))
+        self.addCleanup(self.recipe.delete)
+        self.url = media_url(self.recipe.image.name)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_login_required(self):
+        """Test anonymous requests are refused"""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_owner_gets_file(self):
+        """Test the owner gets the file with long lived cache headers"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.content(res), self.data)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertTrue(res['ETag'].startswith('"'))
+
+    def test_owner_gets_derivative(self):
+        """Test the sizes of an image are served like the image"""
+        name = derivative_name(self.recipe.image.name, 'small', 'JPEG')
+        with open(self.recipe.image.storage.path(name), 'wb') as small:
+            small.write(b'small')
+        self.addCleanup(self.recipe.image.storage.delete, name)
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(self.content(res), b'small')
+
+    def test_other_user_not_found(self):
+        """Test a user without a recipe using the file gets a 404"""
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_path_outside_media_not_found(self):
+        """Test names cannot escape MEDIA_ROOT"""
+        res = self.client.get(media_url('../../etc/passwd'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_modified(self):
+        """Test a client with the current ETag gets a 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        """Test a byte range is answered with a 206"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(self.content(res), self.data[2:6])
+        self.assertEqual(res['Content-Range'], f'bytes 2-5/{len(self.data)}')
+        self.assertEqual(res['Content-Length'], '4')
+
+    def test_suffix_range(self):
+        """Test bytes=-n returns the last n bytes"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+
+        self.assertEqual(self.content(res), self.data[-4:])
+
+    def test_range_not_satisfiable(self):
+        """Test a range past the end of the file gets a 416"""
+        res = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    def test_if_range_mismatch_sends_everything(self):
+        """Test a range for another version returns the whole file"""
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"old"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.content(res), self.data)
+
+    @override_settings(MEDIA_DELIVERY={
+        'SENDFILE_HEADER': 'X-Accel-Redirect',
+        'ACCEL_PREFIX': '/protected-media/', 'MAX_AGE': 60})
+    def test_accel_redirect(self):
+        """Test nginx is told which file to send"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'],
+                         f'/protected-media/{self.recipe.image.name}')
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['Cache-Control'],
+                         'private, max-age=60, immutable')
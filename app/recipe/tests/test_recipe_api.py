@@ -1,6 +1,7 @@
 # comes from python
 # tempfile allows you to create temp files. let's you call on files and remove after
 import tempfile
+from io import BytesIO
 # create path names or checks if files exists in systems
 import os
 
@@ -8,7 +9,9 @@ import os
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -17,6 +20,8 @@ from rest_framework.test import APIClient
 from core.models import Recipe, Tag, Ingredient
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.thumbnails import derivative_name
+from recipe.uploads import ResumableUpload, partial_path
 
 # recipe, app name, recipe-list, will be the name of the url
 RECIPES_URL = reverse('recipe:recipe-list')
@@ -59,6 +64,20 @@ def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
 
+def sample_full_recipe(user, number):
+    """Create and return a recipe with two tags and two ingredients"""
+    recipe = sample_recipe(user=user, title=f'Recipe {number}')
+    recipe.tags.add(
+        sample_tag(user=user, name=f'Tag {number}a'),
+        sample_tag(user=user, name=f'Tag {number}b'),
+    )
+    recipe.ingredients.add(
+        sample_ingredient(user=user, name=f'Ingredient {number}a'),
+        sample_ingredient(user=user, name=f'Ingredient {number}b'),
+    )
+    return recipe
+
+
 class PublicRecipeApiTests(TestCase):
     """Test unauthenticated recipe API access"""
 
@@ -93,7 +112,7 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # checks if the  data from the response is same as the one we created
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Test retrieving recipes for user"""
@@ -108,8 +127,8 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test viewing a recipe detail"""
@@ -249,7 +268,157 @@ class PrivateRecipeApiTests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_filter_recipes_by_tags(self):
+        """Test returning recipes with specific tags"""
+        recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
+        recipe2 = sample_recipe(user=self.user, title='Aubergine with tahini')
+        tag1 = sample_tag(user=self.user, name='Vegan')
+        tag2 = sample_tag(user=self.user, name='Vegetarian')
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag1, tag2)
+        recipe3 = sample_recipe(user=self.user, title='Fish and chips')
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        # a recipe matching several tags is only returned once
+        self.assertEqual(ids, [recipe2.id, recipe1.id])
+        self.assertNotIn(recipe3.id, ids)
+
+    def test_filter_recipes_by_ingredients(self):
+        """Test returning recipes with specific ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
+        recipe2 = sample_recipe(user=self.user, title='Chicken cacciatore')
+        ingredient1 = sample_ingredient(user=self.user, name='Feta cheese')
+        ingredient2 = sample_ingredient(user=self.user, name='Chicken')
+        recipe1.ingredients.add(ingredient1)
+        recipe2.ingredients.add(ingredient2)
+        sample_recipe(user=self.user, title='Steak and mushrooms')
+
+        res = self.client.get(
+            RECIPES_URL, {'ingredients': f'{ingredient1.id}'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe1.id])
+
+    def test_filter_recipes_uses_exists(self):
+        """Test filters compile to a semi-join instead of DISTINCT"""
+        tag = sample_tag(user=self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        sql = ' '.join(query['sql'].upper() for query in queries)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_filter_recipes_invalid_ids(self):
+        """Test that non numeric ids are rejected"""
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def count_queries(self, url):
+        """Return the number of queries a GET request to url runs"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_list_recipes_query_count_constant(self):
+        """Test listing recipes runs the same queries for any result size"""
+        sample_full_recipe(self.user, 1)
+        few = self.count_queries(RECIPES_URL)
+
+        for number in range(2, 12):
+            sample_full_recipe(self.user, number)
+        many = self.count_queries(RECIPES_URL)
+
+        self.assertEqual(few, many)
+
+    def test_list_recipes_paginated_by_cursor(self):
+        """Test walking the recipe list page by page with cursors"""
+        recipes = [sample_recipe(user=self.user) for _ in range(5)]
+
+        ids = []
+        url = f'{RECIPES_URL}?page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                res = self.client.get(url)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                ids.extend(recipe['id'] for recipe in res.data['results'])
+                url = res.data['next']
+
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+        self.assertIsNone(res.data['next'])
+        self.assertIsNotNone(res.data['previous'])
+        # keyset pagination never counts the whole result set
+        for query in queries:
+            self.assertNotIn('COUNT(*)', query['sql'].upper())
+
+    def test_view_recipe_detail_query_count_constant(self):
+        """Test the detail query count does not grow with relations"""
+        recipe = sample_recipe(user=self.user)
+        few = self.count_queries(detail_url(recipe.id))
+
+        for number in range(10):
+            recipe.tags.add(sample_tag(user=self.user, name=f'Tag {number}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingr {number}'))
+        many = self.count_queries(detail_url(recipe.id))
+
+        self.assertEqual(few, many)
 
+    def test_list_recipes_sparse_fields(self):
+        """Test that ?fields= trims the output and the SQL"""
+        recipe = sample_full_recipe(self.user, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'],
+                         [{'id': recipe.id, 'title': recipe.title}])
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('"price"', sql)
+        self.assertNotIn('core_recipe_tags', sql)
+
+    def test_list_recipes_omit_fields(self):
+        """Test that ?omit= drops fields from the output"""
+        sample_full_recipe(self.user, 1)
+
+        res = self.client.get(RECIPES_URL, {'omit': 'tags,ingredients'})
+
+        self.assertEqual(set(res.data['results'][0]),
+                         {'id', 'title', 'time_minutes', 'price', 'link',
+                          'images'})
+
+    def test_view_recipe_detail_sparse_fields(self):
+        """Test that the detail only loads the requested relations"""
+        recipe = sample_full_recipe(self.user, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(detail_url(recipe.id),
+                                  {'fields': 'id,tags'})
+
+        self.assertEqual(set(res.data), {'id', 'tags'})
+        self.assertEqual(res.data['tags'][0]['name'],
+                         recipe.tags.first().name)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('core_recipe_ingredients', sql)
+        self.assertNotIn('"time_minutes"', sql)
+
+    def test_sparse_fields_unknown(self):
+        """Test that unknown fields are rejected"""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+
+# render the image sizes during the request instead of in worker processes
+@override_settings(RECIPE_IMAGE_DERIVATIVES={
+    'SIZES': {'thumbnail': 4, 'medium': 8}, 'FORMAT': 'JPEG', 'WORKERS': 0})
 class RecipeImageUploadTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -262,6 +431,11 @@ class RecipeImageUploadTests(TestCase):
     # tearDown happens after tests are done
     # remove any created image after
     def tearDown(self):
+        if self.recipe.image:
+            for size in ('thumbnail', 'medium'):
+                path = derivative_name(self.recipe.image.path, size, 'JPEG')
+                if os.path.exists(path):
+                    os.remove(path)
         self.recipe.image.delete()
 
     def test_upload_image_to_recipe(self):
@@ -282,6 +456,117 @@ class RecipeImageUploadTests(TestCase):
         # checks path exists in the file system
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def test_upload_image_renders_sizes(self):
+        """Test that every configured size is written and linked"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (20, 10)).save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(set(res.data['images']), {'thumbnail', 'medium'})
+        self.assertTrue(res.data['images']['thumbnail'].endswith(
+            '__thumbnail.jpg'))
+        path = derivative_name(self.recipe.image.path, 'medium', 'JPEG')
+        with Image.open(path) as medium:
+            self.assertEqual(medium.format, 'JPEG')
+            self.assertEqual(medium.size, (8, 4))
+
+    def test_upload_image_leaves_no_partial_files(self):
+        """Test the streamed upload is moved into place, not copied"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertEqual(os.listdir(partial_path('')), [])
+
+    def test_upload_image_not_an_image(self):
+        """Test a file that does not start like an image is rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'definitely not an image' * 100)
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(os.listdir(partial_path('')), [])
+
+    @override_settings(RECIPE_IMAGE_UPLOAD={
+        'MAX_BYTES': 10 * 1024 * 1024, 'MAX_PIXELS': 50})
+    def test_upload_image_too_many_pixels(self):
+        """Test an image is rejected from the size in its header"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_UPLOAD={
+        'MAX_BYTES': 1024, 'MAX_PIXELS': 10 ** 8})
+    def test_upload_image_too_large(self):
+        """Test an upload larger than allowed is rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.effect_noise((100, 100), 50).save(ntf, format='PNG')
+            ntf.seek(0)
+            res = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def put_part(self, data, content_range):
+        return self.client.put(
+            image_upload_url(self.recipe.id), data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=content_range)
+
+    def test_upload_image_in_parts(self):
+        """Test an image sent in two pieces with Content-Range"""
+        buffer = BytesIO()
+        Image.new('RGB', (20, 10)).save(buffer, format='JPEG')
+        data = buffer.getvalue()
+        half, total = len(data) // 2, len(data)
+
+        res = self.put_part(data[:half], f'bytes 0-{half - 1}/{total}')
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data, {'offset': half})
+
+        res = self.put_part(b'', f'bytes */{total}')
+        self.assertEqual(res.data, {'offset': half})
+
+        res = self.put_part(data[half:], f'bytes {half}-{total - 1}/{total}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), data)
+        self.assertEqual(os.listdir(partial_path('')), [])
+
+    def test_upload_image_part_out_of_order(self):
+        """Test a piece not starting at the offset is refused"""
+        res = self.put_part(b'\xff\xd8\xff\xe0', 'bytes 0-3/100')
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+        res = self.put_part(b'1234', 'bytes 10-13/100')
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data, {'offset': 4})
+        ResumableUpload(self.recipe).discard()
+
+    def test_upload_image_part_not_an_image(self):
+        """Test the first piece is checked for an image signature"""
+        res = self.put_part(b'not an image at all', 'bytes 0-18/100')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ResumableUpload(self.recipe).offset, 0)
+
     def test_upload_image_bad_request(self):
         """Test uploading an invalid image"""
         url = image_upload_url(self.recipe.id)
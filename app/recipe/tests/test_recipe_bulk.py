@@ -0,0 +1,160 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.bulk import validate_recipe_batch
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def sample_tag(user, name='Main course'):
+    """Create and return a sample tag"""
+    return Tag.objects.create(user=user, name=name)
+
+
+def sample_ingredient(user, name='Cinnamon'):
+    """Create and return a sample ingredient"""
+    return Ingredient.objects.create(user=user, name=name)
+
+
+def payload(number, **params):
+    """Return the payload of one recipe of a batch"""
+    defaults = {
+        'title': f'Recipe {number}',
+        'time_minutes': 10,
+        'price': '5.00',
+    }
+    defaults.update(params)
+    return defaults
+
+
+class RecipeBulkApiTests(TestCase):
+    """Test the recipe batch create/update endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """Test creating a batch of recipes with their relations"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        items = [payload(number, tags=[tag.id], ingredients=[ingredient.id])
+                 for number in range(5)]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['status'] for item in res.data],
+                         ['created'] * 5)
+        for item, result in zip(items, res.data):
+            recipe = Recipe.objects.get(id=result['id'])
+            self.assertEqual(recipe.title, item['title'])
+            self.assertEqual(list(recipe.tags.all()), [tag])
+            self.assertEqual(list(recipe.ingredients.all()), [ingredient])
+
+    def test_bulk_update(self):
+        """Test updating recipes replaces the given fields and relations"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Old title', time_minutes=5, price=1)
+        recipe.tags.add(sample_tag(user=self.user, name='Old'))
+        new_tag = sample_tag(user=self.user, name='New')
+        items = [
+            {'id': recipe.id, 'title': 'New title', 'tags': [new_tag.id]},
+            payload(1),
+        ]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data[0], {'id': recipe.id, 'status': 'updated'})
+        self.assertEqual(res.data[1]['status'], 'created')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(recipe.price, Decimal('1.00'))
+        self.assertEqual(list(recipe.tags.all()), [new_tag])
+
+    def test_bulk_errors_per_item(self):
+        """Test invalid items are reported and nothing is written"""
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        other_tag = sample_tag(user=other)
+        other_recipe = Recipe.objects.create(
+            user=other, title='Not mine', time_minutes=5, price=1)
+        items = [
+            payload(0),
+            payload(1, time_minutes='soon'),
+            payload(2, tags=[other_tag.id]),
+            {'id': other_recipe.id, 'title': 'Stolen'},
+        ]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 4)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[1])
+        self.assertIn('tags', res.data[2])
+        self.assertIn('id', res.data[3])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_repeated_id(self):
+        """Test updating the same recipe twice in a batch is refused"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=5, price=1)
+        tag = sample_tag(user=self.user)
+        items = [
+            {'id': recipe.id, 'tags': [tag.id]},
+            {'id': recipe.id, 'tags': [tag.id]},
+        ]
+
+        res = self.client.post(BULK_URL, items, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(res.data[1]['id'],
+                         ['Recipe appears more than once in the batch.'])
+        self.assertFalse(recipe.tags.exists())
+
+    def test_bulk_requires_list(self):
+        """Test the endpoint only accepts a non empty list"""
+        res = self.client.post(BULK_URL, payload(0), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_validation_queries_constant(self):
+        """Test related ids are checked with one query per table"""
+        tags = [sample_tag(user=self.user, name=f'Tag {n}') for n in range(5)]
+        ingredient = sample_ingredient(user=self.user)
+        recipe = Recipe.objects.create(
+            user=self.user, title='Existing', time_minutes=5, price=1)
+        items = [payload(n, tags=[tag.id for tag in tags],
+                         ingredients=[ingredient.id]) for n in range(50)]
+        items.append({'id': recipe.id, 'title': 'Updated'})
+
+        # tags, ingredients and the recipes to update
+        with self.assertNumQueries(3):
+            validated, errors = validate_recipe_batch(self.user, items)
+
+        self.assertFalse(any(errors))
+
+    def test_bulk_create_visible_in_list(self):
+        """Test bulk created recipes show up in a cached list and search"""
+        self.client.get(RECIPES_URL)
+
+        self.client.post(BULK_URL, [payload(0, title='Thai green curry')],
+                         format='json')
+        res = self.client.get(RECIPES_URL)
+        found = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(len(found.data['results']), 1)
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeSearchApiTests(TestCase):
+    """Test full-text search of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        """Return the ids of the recipes matching query"""
+        res = self.client.get(RECIPES_URL, {'search': query, **params})
+        return [recipe['id'] for recipe in res.data['results']]
+
+    def test_search_title(self):
+        """Test searching recipes by a word of the title"""
+        recipe = sample_recipe(user=self.user, title='Thai green curry')
+        sample_recipe(user=self.user, title='Fish and chips')
+
+        self.assertEqual(self.search('curry'), [recipe.id])
+
+    def test_search_all_words(self):
+        """Test every word of the query has to match"""
+        recipe = sample_recipe(user=self.user, title='Thai green curry')
+        sample_recipe(user=self.user, title='Red curry')
+
+        self.assertEqual(self.search('green curry'), [recipe.id])
+
+    def test_search_tag_and_ingredient_names(self):
+        """Test recipes are found by the names of their relations"""
+        recipe1 = sample_recipe(user=self.user, title='Pancakes')
+        recipe2 = sample_recipe(user=self.user, title='Porridge')
+        recipe1.tags.add(Tag.objects.create(user=self.user, name='Breakfast'))
+        recipe2.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Oats'))
+
+        self.assertEqual(self.search('breakfast'), [recipe1.id])
+        self.assertEqual(self.search('oats'), [recipe2.id])
+
+    def test_search_updated_on_relation_changes(self):
+        """Test the search document follows renames and removals"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe.tags.add(tag)
+
+        tag.name = 'Brunch'
+        tag.save()
+        self.assertEqual(self.search('brunch'), [recipe.id])
+        self.assertEqual(self.search('breakfast'), [])
+
+        recipe.tags.remove(tag)
+        self.assertEqual(self.search('brunch'), [])
+
+    def test_search_updated_on_delete(self):
+        """Test deleting a tag removes it from the search document"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe.tags.add(tag)
+
+        tag.delete()
+
+        self.assertEqual(self.search('breakfast'), [])
+
+    def test_search_title_ranked_first(self):
+        """Test title matches rank above tag and ingredient matches"""
+        tagged = sample_recipe(user=self.user, title='Fruit salad')
+        tagged.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        titled = sample_recipe(user=self.user, title='Vegan burger')
+
+        self.assertEqual(self.search('vegan'), [titled.id, tagged.id])
+
+    def test_search_paginated(self):
+        """Test walking search results page by page"""
+        recipes = [sample_recipe(user=self.user, title=f'Curry {number}')
+                   for number in range(5)]
+
+        ids = []
+        res = self.client.get(RECIPES_URL, {'search': 'curry', 'page_size': 2})
+        while True:
+            ids.extend(recipe['id'] for recipe in res.data['results'])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(sorted(ids), sorted(r.id for r in recipes))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_search_limited_to_user(self):
+        """Test other users' recipes are never found"""
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        sample_recipe(user=other, title='Thai green curry')
+
+        self.assertEqual(self.search('curry'), [])
@@ -0,0 +1,188 @@
+import fnmatch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import RedisBackend, get_response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class FakeRedis:
+    """Stand-in for a redis client, keeps the data in a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        # redis hands back bytes whatever was stored
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data)
+                if fnmatch.fnmatch(key, pattern)]
+
+
+class ResponseCacheApiTests(TestCase):
+    """Test caching of recipe API responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.client.force_authenticate(self.user)
+        get_response_cache().clear()
+
+    def test_second_request_served_from_cache(self):
+        """Test a repeated request only runs the validator query"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+        # the conditional GET validator, nothing is serialized again
+        with self.assertNumQueries(1):
+            cached = self.client.get(RECIPES_URL)
+
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.data, res.data)
+
+    def test_query_string_part_of_key(self):
+        """Test different query strings are cached separately"""
+        self.client.get(TAGS_URL)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_cache_per_user(self):
+        """Test users never see each other's cached responses"""
+        sample_recipe(user=self.user, title='Mine')
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_invalidated_by_create(self):
+        """Test creating a tag invalidates the cached tag list"""
+        self.client.get(TAGS_URL)
+        self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['name'], 'Vegan')
+
+    def test_invalidated_by_update(self):
+        """Test updating a recipe invalidates the cached detail"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(detail_url(recipe.id))
+        self.client.patch(detail_url(recipe.id), {'title': 'Chicken tikka'})
+
+        res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['title'], 'Chicken tikka')
+
+    def test_invalidated_by_m2m_change(self):
+        """Test adding a tag to a recipe invalidates the cached list"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        # clear the generation set by the tag save, only m2m_changed is left
+        get_response_cache().clear()
+        self.client.get(RECIPES_URL)
+        recipe.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['tags'], [tag.id])
+
+    def test_other_users_writes_keep_cache(self):
+        """Test writes by another user do not invalidate the cache"""
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        sample_recipe(user=other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_errors_not_cached(self):
+        """Test a missing recipe is looked up again every time"""
+        self.client.get(detail_url(999))
+
+        res = self.client.get(detail_url(999))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(get_response_cache().stats()['hits'], 0)
+
+    def test_stats_counters(self):
+        """Test hits and misses are exposed to admins"""
+        self.client.get(TAGS_URL)
+        self.client.get(TAGS_URL)
+        admin = get_user_model().objects.create_superuser(
+            'admin@londonappdev.com', 'testpass')
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.data['hits'], 1)
+        self.assertEqual(res.data['misses'], 1)
+
+    def test_stats_admin_only(self):
+        """Test regular users cannot read the cache stats"""
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(RECIPE_RESPONSE_CACHE={
+        'BACKEND': 'recipe.tests.test_response_cache.fake_redis_backend',
+    })
+    def test_redis_backend(self):
+        """Test responses can be cached in a redis compatible store"""
+        self.client.get(TAGS_URL)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertIsInstance(get_response_cache().backend, RedisBackend)
+
+        Tag.objects.create(user=self.user, name='Vegan')
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+
+def fake_redis_backend(options):
+    """Build a redis backend talking to a FakeRedis"""
+    return RedisBackend(options, client=FakeRedis())
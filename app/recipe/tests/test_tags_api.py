@@ -5,11 +5,12 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Tag
+from core.models import Recipe, Tag
 
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
 
 
 class PublicTagsApiTests(TestCase):
@@ -45,7 +46,7 @@ class PrivateTagsApiTests(TestCase):
         # many=True for multiple objects
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test that tags returned are for authenticated user"""
@@ -57,9 +58,30 @@ class PrivateTagsApiTests(TestCase):
         response = self.client.get(TAGS_URL)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
         # check first element of response checks name
-        self.assertEqual(response.data[0]['name'], tag.name)
+        self.assertEqual(response.data['results'][0]['name'], tag.name)
+
+    def test_tags_paginated_by_cursor(self):
+        """Test that tags are paged by name using cursors"""
+        for name in ('Breakfast', 'Dessert', 'Lunch', 'Vegan', 'Dinner'):
+            Tag.objects.create(user=self.user, name=name)
+
+        response = self.client.get(TAGS_URL, {'page_size': 2})
+        names = [tag['name'] for tag in response.data['results']]
+        next_page = self.client.get(response.data['next'])
+        names += [tag['name'] for tag in next_page.data['results']]
+
+        self.assertEqual(names, ['Vegan', 'Lunch', 'Dinner', 'Dessert'])
+        self.assertNotIn('count', response.data)
+
+    def test_tags_sparse_fields(self):
+        """Test that tags can be listed with only their names"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        response = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(response.data['results'], [{'name': 'Vegan'}])
 
     def test_create_tag_successful(self):
         """Test creating a new tag"""
@@ -78,3 +100,106 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.post(TAGS_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_tag_duplicate(self):
+        """Test creating a tag the user already has fails"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': ' Vegan '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_get_or_create_tags(self):
+        """Test that bulk returns the id of existing and new tags"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        user2 = get_user_model().objects.create_user(
+            'other@londonappdev.com', 'testpass')
+        Tag.objects.create(user=user2, name='Dessert')
+
+        names = ['Vegan', 'Dessert', ' Dessert', 'Quick  lunch']
+        # one query to find the existing tags, one to insert the rest and
+        # one to read back their ids
+        with self.assertNumQueries(3):
+            res = self.client.post(
+                TAGS_BULK_URL, {'names': names}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tags = dict(Tag.objects.filter(user=self.user)
+                    .values_list('name', 'id'))
+        self.assertEqual(set(tags), {'Vegan', 'Dessert', 'Quick lunch'})
+        self.assertEqual(res.data, {
+            'Vegan': vegan.id,
+            'Dessert': tags['Dessert'],
+            ' Dessert': tags['Dessert'],
+            'Quick  lunch': tags['Quick lunch'],
+        })
+
+    def test_bulk_existing_tags_inserts_nothing(self):
+        """Test that bulk with only known names is a single query"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.assertNumQueries(1):
+            res = self.client.post(
+                TAGS_BULK_URL, {'names': ['Vegan']}, format='json')
+
+        self.assertEqual(res.data, {'Vegan': tag.id})
+
+    def test_bulk_tags_invalid(self):
+        """Test that bulk rejects blank names"""
+        res = self.client.post(
+            TAGS_BULK_URL, {'names': ['Vegan', '  ']}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_retrieve_tags_assigned_to_recipes(self):
+        """Test filtering tags by those assigned to recipes"""
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            title='Coriander eggs on toast',
+            time_minutes=10,
+            price=5.00,
+            user=self.user)
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertIn(tag1.name, names)
+        self.assertNotIn(tag2.name, names)
+
+    def test_retrieve_tags_assigned_unique(self):
+        """Test filtering tags by assigned returns unique items"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        for title in ('Pancakes', 'Porridge'):
+            recipe = Recipe.objects.create(
+                title=title, time_minutes=5, price=3.00, user=self.user)
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_retrieve_tags_assigned_true(self):
+        """Test assigned_only also accepts true and false"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            title='Pancakes', time_minutes=5, price=3.00, user=self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 'true'})
+        self.assertEqual([tag['name'] for tag in res.data['results']],
+                         ['Breakfast'])
+        res = self.client.get(TAGS_URL, {'assigned_only': 'false'})
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_retrieve_tags_assigned_invalid(self):
+        """Test an invalid assigned_only is a bad request"""
+        res = self.client.get(TAGS_URL, {'assigned_only': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('assigned_only', res.data)
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.test import SimpleTestCase, override_settings
+
+from recipe.thumbnails import derivative_name, derivative_urls, \
+    render_derivatives
+
+
+class ThumbnailTests(SimpleTestCase):
+    """Test rendering the downscaled copies of recipe images"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def sample_image(self, size, mode='RGB', image_format='JPEG'):
+        path = os.path.join(self.directory, f'original.{image_format}')
+        Image.new(mode, size).save(path, image_format)
+        return path
+
+    def test_derivative_name(self):
+        """Test derivatives are stored next to the original"""
+        self.assertEqual(
+            derivative_name('uploads/recipe/abc.jpeg', 'small', 'WEBP'),
+            'uploads/recipe/abc__small.webp')
+
+    def test_render_all_sizes_keeping_aspect_ratio(self):
+        """Test every size fits its edge and keeps the aspect ratio"""
+        path = self.sample_image((1600, 800))
+
+        written = render_derivatives(
+            path, {'small': 100, 'large': 400}, 'WEBP', 80)
+
+        self.assertEqual(len(written), 2)
+        for size, expected in (('small', (100, 50)), ('large', (400, 200))):
+            with Image.open(derivative_name(path, size, 'WEBP')) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, expected)
+
+    def test_render_never_upscales(self):
+        """Test images smaller than a size are not enlarged"""
+        path = self.sample_image((50, 30))
+
+        render_derivatives(path, {'large': 400}, 'JPEG', 80)
+
+        with Image.open(derivative_name(path, 'large', 'JPEG')) as image:
+            self.assertEqual(image.size, (50, 30))
+
+    def test_render_transparent_image_as_jpeg(self):
+        """Test transparency is dropped for formats without alpha"""
+        path = self.sample_image((40, 40), mode='RGBA', image_format='PNG')
+
+        render_derivatives(path, {'small': 20}, 'JPEG', 80)
+
+        with Image.open(derivative_name(path, 'small', 'JPEG')) as image:
+            self.assertEqual(image.mode, 'RGB')
+
+    @override_settings(MEDIA_URL='/media/', RECIPE_IMAGE_DERIVATIVES={
+        'SIZES': {'small': 100}, 'FORMAT': 'JPEG'})
+    def test_derivative_urls(self):
+        """Test the URL of each configured size"""
+        self.assertEqual(derivative_urls('uploads/recipe/abc.png'),
+                         {'small': '/media/uploads/recipe/abc__small.jpg'})
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe.serializers import IngredientSerializer, \
+    RecipeDetailSerializer, RecipeSerializer, TagSerializer
+from recipe.values import ValuesSerializer
+
+
+class ValuesSerializerTests(TestCase):
+    """Test that the values() path renders like the model serializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        tags = [Tag.objects.create(user=self.user, name=name)
+                for name in ('Vegan', 'Dessert', 'Quick')]
+        ingredients = [Ingredient.objects.create(user=self.user, name=name)
+                       for name in ('Salt', 'Kale')]
+        Recipe.objects.create(
+            user=self.user, title='Plain toast', time_minutes=2, price=0.5)
+        linked = Recipe.objects.create(
+            user=self.user, title='Kale crisps', time_minutes=25,
+            price='12.30', link='https://example.com/kale')
+        # added out of id order
+        linked.tags.add(tags[2], tags[0])
+        linked.ingredients.add(*ingredients)
+
+    def assertRendersAlike(self, serializer_class, queryset):
+        expected = JSONRenderer().render(
+            serializer_class(queryset, many=True).data)
+        serializer = ValuesSerializer(serializer_class)
+        rendered = JSONRenderer().render(
+            serializer.to_representation(serializer.values(queryset)))
+
+        self.assertEqual(rendered, expected)
+
+    def test_recipes_render_alike(self):
+        """Test recipes with and without relations render byte for byte"""
+        queryset = Recipe.objects.order_by('-id').prefetch_related(
+            Prefetch('ingredients', Ingredient.objects.order_by('id')),
+            Prefetch('tags', Tag.objects.order_by('id')),
+        )
+
+        self.assertRendersAlike(RecipeSerializer, queryset)
+
+    def test_tags_and_ingredients_render_alike(self):
+        """Test tags and ingredients render byte for byte"""
+        self.assertRendersAlike(TagSerializer, Tag.objects.order_by('-name'))
+        self.assertRendersAlike(
+            IngredientSerializer, Ingredient.objects.order_by('-name'))
+
+    def test_related_ids_one_query_per_relation(self):
+        """Test that a page costs one query plus one per relation"""
+        serializer = ValuesSerializer(RecipeSerializer)
+
+        with self.assertNumQueries(3):
+            serializer.to_representation(
+                serializer.values(Recipe.objects.all()))
+
+    def test_nested_serializer_rejected(self):
+        """Test that nested objects cannot be read from values()"""
+        with self.assertRaises(TypeError):
+            ValuesSerializer(RecipeDetailSerializer)
@@ -0,0 +1,121 @@
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+# a derivative is stored as <stem of the original>__<size>.<ext>
+DERIVATIVE_RE = re.compile(r'^(?P<stem>.+)__[^/.]+\.\w+$')
+
+
+def derivative_name(name, size, image_format):
+    """Return the name of one derivative size of the image stored as name"""
+    stem, _ = os.path.splitext(name)
+    return f'{stem}__{size}.{EXTENSIONS[image_format]}'
+
+
+def original_stem(name):
+    """Return the name of the original without extension if name is a
+    derivative, else None"""
+    match = DERIVATIVE_RE.match(name)
+    return match.group('stem') if match else None
+
+
+def derivative_urls(name):
+    """Return {size: url} of the derivatives of the image stored as name"""
+    options = settings.RECIPE_IMAGE_DERIVATIVES
+    return {
+        size: default_storage.url(
+            derivative_name(name, size, options['FORMAT']))
+        for size in options['SIZES']
+    }
+
+
+def delete_derivatives(name):
+    """Delete every size of the image stored as name"""
+    options = settings.RECIPE_IMAGE_DERIVATIVES
+    for size in options['SIZES']:
+        default_storage.delete(derivative_name(name, size, options['FORMAT']))
+
+
+def render_derivatives(path, sizes, image_format, quality):
+    """Write every size of the image at path, return the paths written
+
+    Runs in a worker process. The image is decoded once, JPEGs straight
+    at the smallest 1/2, 1/4 or 1/8 scale still larger than the biggest
+    size, then shrunk from the largest size to the smallest.
+    """
+    with Image.open(path) as image:
+        largest = max(sizes.values())
+        image.draft('RGB', (largest, largest))
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        mode = 'RGBA' if has_alpha and image_format != 'JPEG' else 'RGB'
+        image = image.convert(mode)
+
+    written = []
+    for size, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        # keeps the aspect ratio and never upscales
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        target = derivative_name(path, size, image_format)
+        # readers never see a half written file
+        partial = f'{target}.partial'
+        image.save(partial, image_format, quality=quality)
+        os.replace(partial, target)
+        written.append(target)
+    return written
+
+
+_executor = None
+
+
+def get_executor():
+    """Return the process pool rendering derivatives, None to run inline"""
+    global _executor
+    workers = settings.RECIPE_IMAGE_DERIVATIVES.get('WORKERS', 2)
+    if _executor is None and workers:
+        # created on first use so forked app servers each get their own
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+@receiver(setting_changed)
+def reset_executor(setting, **kwargs):
+    """Pick up the worker count when tests override it"""
+    global _executor
+    if setting == 'RECIPE_IMAGE_DERIVATIVES' and _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def schedule_derivatives(name):
+    """Render the derivatives of the stored image name off the request"""
+    options = settings.RECIPE_IMAGE_DERIVATIVES
+    # images are stored once per content, a known one is already rendered
+    if all(default_storage.exists(
+            derivative_name(name, size, options['FORMAT']))
+            for size in options['SIZES']):
+        return None
+    args = (default_storage.path(name), options['SIZES'],
+            options['FORMAT'], options.get('QUALITY', 80))
+    executor = get_executor()
+    if executor is None:
+        return render_derivatives(*args)
+
+    future = executor.submit(render_derivatives, *args)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Rendering image derivatives failed',
+                     exc_info=future.exception())
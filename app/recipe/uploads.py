@@ -0,0 +1,217 @@
+import hashlib
+import os
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+
+# uploads in progress, on the same filesystem as the images so finishing
+# one is a rename instead of a copy
+PARTIAL_DIR = 'uploads/recipe/partial'
+
+# file signatures of the formats accepted, WebP is checked separately
+SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+
+class ImageRejected(ValueError):
+    """An upload is not an image or too large to accept"""
+
+
+def partial_path(name):
+    """Return the path of an upload in progress, creating its directory"""
+    path = default_storage.path(os.path.join(PARTIAL_DIR, name))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+class ImageHeaderCheck:
+    """Check an image upload from its first bytes, as they arrive
+
+    Raises ImageRejected as soon as the payload is larger than allowed,
+    does not start like an image or declares more pixels than allowed,
+    so a bad upload is dropped without reading the rest of it.
+    """
+
+    def __init__(self):
+        options = settings.RECIPE_IMAGE_UPLOAD
+        self.max_bytes = options['MAX_BYTES']
+        self.max_pixels = options['MAX_PIXELS']
+        # JPEGs may carry large EXIF or ICC blocks before their dimensions
+        self.header_bytes = options.get('HEADER_BYTES', 256 * 1024)
+        self.size = 0
+        self.header = b''
+        self.dimensions = None
+
+    def feed(self, chunk):
+        """Account for the next chunk of the upload"""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ImageRejected(
+                f'Image is larger than {self.max_bytes} bytes.')
+        if self.dimensions is not None:
+            return
+
+        self.header += chunk[:self.header_bytes - len(self.header)]
+        if len(self.header) >= 12 and not self.header.startswith(
+                SIGNATURES) and self.header[8:12] != b'WEBP':
+            raise ImageRejected('Upload a valid image.')
+
+        try:
+            # only parses the header, the pixels are not decoded
+            with Image.open(BytesIO(self.header)) as image:
+                self.dimensions = image.size
+        except Image.DecompressionBombError:
+            raise ImageRejected('Image has too many pixels.')
+        except Exception:
+            if len(self.header) >= self.header_bytes:
+                raise ImageRejected('Upload a valid image.')
+            # not enough of the header yet
+            return
+
+        width, height = self.dimensions
+        if not width or not height or width * height > self.max_pixels:
+            raise ImageRejected('Image has too many pixels.')
+
+    def finish(self):
+        """Check the whole upload was seen to be an image"""
+        if self.dimensions is None:
+            raise ImageRejected('Upload a valid image.')
+
+
+class PartialUploadedFile(UploadedFile):
+    """Upload written straight into the media directory
+
+    Storage moves it to its final name with a rename, see
+    FileSystemStorage._save and temporary_file_path.
+    """
+
+    def __init__(self, path, name, content_type=None, size=0, charset=None,
+                 content_type_extra=None):
+        super().__init__(open(path, 'ab+'), name, content_type, size,
+                         charset, content_type_extra)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            # still here when the upload was not saved
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """Write image uploads to the media directory as the chunks arrive
+
+    Replaces the default handlers that keep small uploads in memory and
+    copy larger ones into a temporary file first.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # leave some room for the multipart headers and other fields
+        limit = settings.RECIPE_IMAGE_UPLOAD['MAX_BYTES'] + 64 * 1024
+        if content_length > limit:
+            raise MultiPartParserError(
+                f'Request body is larger than {limit} bytes.')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.check = ImageHeaderCheck()
+        # the storage names the file after its digest, see core.storage
+        self.digest = hashlib.sha256()
+        self.file = PartialUploadedFile(
+            partial_path(f'{uuid.uuid4()}.part'), self.file_name,
+            self.content_type, 0, self.charset, self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            self.check.feed(raw_data)
+        except ImageRejected as exc:
+            self.file.close()
+            raise MultiPartParserError(str(exc))
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        try:
+            self.check.finish()
+        except ImageRejected as exc:
+            self.file.close()
+            raise MultiPartParserError(str(exc))
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.digest = self.digest.hexdigest()
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+
+
+class ResumableUpload:
+    """An image sent in pieces with Content-Range PUTs
+
+    Each piece is appended to a partial file named after the recipe, a
+    piece that does not start where the previous one ended is refused so
+    the client can ask for the offset and send the rest again.
+    """
+
+    def __init__(self, recipe):
+        self.path = partial_path(f'recipe-{recipe.pk}.part')
+
+    @property
+    def offset(self):
+        """Return how many bytes were received so far"""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, stream, start, end, total, chunk_size=64 * 1024):
+        """Append the bytes start to end of total, return the new offset
+
+        A piece cut short by a dropped connection keeps what arrived.
+        """
+        check = ImageHeaderCheck()
+        if total > check.max_bytes:
+            raise ImageRejected(
+                f'Image is larger than {check.max_bytes} bytes.')
+        # the header is always checked from the start of the file
+        if start:
+            with open(self.path, 'rb') as partial:
+                check.feed(partial.read(check.header_bytes))
+
+        with open(self.path, 'ab') as partial:
+            offset = start
+            while offset <= end:
+                chunk = stream.read(min(chunk_size, end + 1 - offset))
+                if not chunk:
+                    break
+                if offset < check.header_bytes or check.dimensions is None:
+                    check.feed(chunk)
+                partial.write(chunk)
+                offset += len(chunk)
+        if offset == total:
+            check.finish()
+        return offset
+
+    def uploaded_file(self):
+        """Return the finished upload, ready to be saved to an ImageField"""
+        with Image.open(self.path) as image:
+            # recipe_image_file_path keeps the extension of the name
+            name = f'upload.{image.format.lower()}'
+        return PartialUploadedFile(self.path, name, size=self.offset)
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -19,4 +19,8 @@ router.register('recipes', views.RecipeViewSet)
 # this allows you to register app name for reverse('recipe:Tags')
 app_name = 'recipe'
 
-urlpatterns = [path('', include(router.urls))]
+urlpatterns = [
+    path('cache-stats/', views.ResponseCacheStatsView.as_view(),
+         name='cache-stats'),
+    path('', include(router.urls)),
+]
@@ -0,0 +1,117 @@
+from functools import lru_cache
+
+from rest_framework.relations import ManyRelatedField
+from rest_framework.response import Response
+
+from core.timing import measure
+
+
+class ValuesSerializer:
+    """Read only stand-in for a ModelSerializer working on values() rows
+
+    Renders the same data as serializer_class without building model
+    instances: the columns come from one values() query and every many to
+    many field from one query on its through table per page, rendered as
+    a list of ids in ascending order. Each column still goes through the
+    to_representation of its DRF field so the output is identical.
+    fields limits the output to the given field names.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        model = serializer_class.Meta.model
+        self.pk = model._meta.pk.attname
+        # (field name, column, to_representation), relations have no column
+        self.fields = []
+        # field name -> (through model, recipe column, related column)
+        self.relations = {}
+
+        for name, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if isinstance(field, ManyRelatedField):
+                m2m = model._meta.get_field(field.source)
+                self.relations[name] = (m2m.remote_field.through,
+                                        m2m.m2m_column_name(),
+                                        m2m.m2m_reverse_name())
+                self.fields.append((name, None, None))
+            elif '.' in field.source or field.source == '*' or \
+                    hasattr(field, 'fields') or hasattr(field, 'child'):
+                raise TypeError(
+                    f'{serializer_class.__name__}.{name} cannot be read '
+                    'from values()')
+            else:
+                self.fields.append(
+                    (name, field.source, field.to_representation))
+
+        self.columns = [self.pk] + [
+            column for _, column, _ in self.fields
+            if column is not None and column != self.pk]
+
+    def values(self, queryset, *extra):
+        """Return queryset as dicts of the columns needed and extra"""
+        # prefetching is done by to_representation, once per page
+        return queryset.prefetch_related(None) \
+            .values(*dict.fromkeys(self.columns + list(extra)))
+
+    def to_representation(self, rows):
+        """Return the serialized data of a list of values() rows"""
+        rows = list(rows)
+        ids = [row[self.pk] for row in rows]
+        related = {name: self._related_ids(ids, *relation)
+                   for name, relation in self.relations.items()}
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, to_representation in self.fields:
+                if column is None:
+                    item[name] = related[name].get(row[self.pk], [])
+                    continue
+                value = row[column]
+                # like Serializer.to_representation, None is never converted
+                item[name] = None if value is None \
+                    else to_representation(value)
+            data.append(item)
+        return data
+
+    def _related_ids(self, ids, through, column, related_column):
+        """Return {id: [related ids]} read from a through table"""
+        grouped = {}
+        if not ids:
+            return grouped
+        rows = through.objects.filter(**{f'{column}__in': ids}) \
+            .order_by(column, related_column) \
+            .values_list(column, related_column)
+        for pk, related_pk in rows:
+            grouped.setdefault(pk, []).append(related_pk)
+        return grouped
+
+
+@lru_cache(maxsize=256)
+def values_serializer(serializer_class, fields=None):
+    """Return the ValuesSerializer of a serializer class, built once"""
+    return ValuesSerializer(serializer_class, fields)
+
+
+class ValuesListMixin:
+    """Serve the list action from values() rows instead of model instances"""
+
+    def list(self, request, *args, **kwargs):
+        get_fields = getattr(self, 'get_sparse_fields', None)
+        serializer = values_serializer(
+            self.get_serializer_class(), get_fields() if get_fields else None)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        # the cursor of the next page is read from the ordering columns
+        get_ordering = getattr(self.paginator, 'get_ordering', None)
+        ordering = get_ordering(request, queryset, self) \
+            if get_ordering else ()
+        page = self.paginate_queryset(serializer.values(
+            queryset, *(field.lstrip('-') for field in ordering)))
+        with measure('serialize'):
+            data = serializer.to_representation(
+                serializer.values(queryset) if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+
+        return Response(data)
@@ -1,52 +1,221 @@
+import re
+
+from django.db.models import Count, Exists, Max, OuterRef
+
 from core.models import Ingredient, Recipe, Tag
+from core.routers import ReplicaReadMixin
+from core.search import search_recipes
+from core.timing import ServerTimingMixin
 from rest_framework import mixins, status, viewsets  # , generics
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 # custom respone
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from recipe import serializers
+from recipe.bulk import get_or_create_names, save_recipe_batch, \
+    validate_recipe_batch
+from recipe.cache import CachedResponseMixin, get_response_cache
+from recipe.conditional import ConditionalGetMixin
+from recipe.pagination import RecipeAttrCursorPagination, \
+    RecipeCursorPagination
+from recipe.sparse import SparseFieldsMixin
+from recipe.thumbnails import schedule_derivatives
+from recipe.uploads import ImageRejected, ResumableUpload, \
+    StreamingImageUploadHandler
+from recipe.values import ValuesListMixin
+from user.authentication import CachedTokenAuthentication
+
+
+# bytes <start>-<end>/<total> or bytes */<total>
+CONTENT_RANGE_RE = re.compile(r'^bytes (?:(\d+)-(\d+)|\*)/(\d+)$')
+
+
+def _params_to_ints(name, value):
+    """Convert a comma separated string of IDs to a list of integers"""
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError({name: 'Expected a comma separated list of ids'})
+
+
+def _param_to_bool(name, value):
+    """Convert a 0/1 or false/true query parameter to a boolean"""
+    try:
+        return {'0': False, '1': True, 'false': False, 'true': True}[
+            value.lower()]
+    except KeyError:
+        raise ValidationError({name: 'Expected 0, 1, false or true'})
+
+
+# filtering on an M2M relation with tags__id__in joins the through table and
+# needs DISTINCT to undo the fan-out, an EXISTS subquery is a semi-join that
+# stops at the first matching through row (uses the indexes from 0007)
+def _filter_exists(queryset, name, through_rows):
+    """Keep the rows of queryset for which through_rows is not empty"""
+    # Django 2.1 can only filter on an Exists once it is annotated
+    return queryset.annotate(**{name: Exists(through_rows)}) \
+        .filter(**{name: True})
 
 
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
-                            mixins.CreateModelMixin):
+class BaseRecipeAttrViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                            CachedResponseMixin, SparseFieldsMixin,
+                            ValuesListMixin, ServerTimingMixin,
+                            viewsets.GenericViewSet,
+                            mixins.ListModelMixin, mixins.CreateModelMixin):
     """Base viewset for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeAttrCursorPagination
+    # largest list accepted by the bulk endpoint
+    bulk_max_items = 10000
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+
+        # ?assigned_only=1 only returns the ones used by at least one recipe
+        if self.assigned_only():
+            queryset = _filter_exists(
+                queryset, 'is_assigned',
+                self.recipe_through.objects.filter(
+                    **{self.recipe_through_field: OuterRef('pk')}))
+
+        return queryset.order_by('-name')
+
+    def assigned_only(self):
+        """Return True if only the ones used by a recipe are listed"""
+        return _param_to_bool('assigned_only', self.request.query_params
+                              .get('assigned_only', '0'))
+
+    def get_validator_aggregates(self):
+        """Return the aggregates the conditional GET validator is built of"""
+        aggregates = super().get_validator_aggregates()
+        if self.assigned_only():
+            # which rows are listed depends on the through rows, adding or
+            # removing one bumps its recipe (see recipe.signals)
+            aggregates.update({
+                'recipes_last_modified': Max('recipe__updated_at'),
+                'links': Count('recipe'),
+            })
+        return aggregates
 
     def perform_create(self, serializer):
         """Create a new ingredient"""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Get or create a list of names, return the id of each name"""
+        serializer = serializers.RecipeAttrBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = serializer.validated_data['names']
+        if len(names) > self.bulk_max_items:
+            return Response(
+                {'detail': f'At most {self.bulk_max_items} names at once'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        ids = get_or_create_names(
+            self.queryset.model, request.user, names)
+        return Response(ids, status=status.HTTP_200_OK)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database"""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    # through table linking tags to recipes and its column for the tag
+    recipe_through = Recipe.tags.through
+    recipe_through_field = 'tag'
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database"""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    recipe_through = Recipe.ingredients.through
+    recipe_through_field = 'ingredient'
 
 
 # ModelViewSet let's you create objects out of the box
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    CachedResponseMixin, SparseFieldsMixin, ValuesListMixin,
+                    ServerTimingMixin, viewsets.ModelViewSet):
     """Manage recipes in the database"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    pagination_class = RecipeCursorPagination
+    # largest list accepted by the bulk endpoint
+    bulk_max_items = 10000
 
     def get_queryset(self):
         """Retrieve the recipes for the authenticated user"""
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+
+        # ?tags=1,2&ingredients=3 returns recipes with any of the given ids
+        tags = self.request.query_params.get('tags')
+        ingredients = self.request.query_params.get('ingredients')
+        if tags:
+            queryset = _filter_exists(
+                queryset, 'has_tags',
+                Recipe.tags.through.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    tag_id__in=_params_to_ints('tags', tags)))
+        if ingredients:
+            queryset = _filter_exists(
+                queryset, 'has_ingredients',
+                Recipe.ingredients.through.objects.filter(
+                    recipe_id=OuterRef('pk'),
+                    ingredient_id__in=_params_to_ints(
+                        'ingredients', ingredients)))
+
+        # ?search= matches the title, tag and ingredient names
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_recipes(queryset, search)
+
+        # load the M2M relations up front so serializing costs a fixed number
+        # of queries instead of two extra queries per recipe, the list reads
+        # the ids from the through tables itself (see recipe.values)
+        if self.action == 'retrieve':
+            # the detail serializer renders the nested objects, only load the
+            # ones asked for with ?fields= or ?omit=
+            fields = self.get_sparse_fields()
+            return self.only_sparse_fields(queryset).prefetch_related(*(
+                name for name in ('ingredients', 'tags')
+                if fields is None or name in fields))
+
+        return queryset
+
+    def get_pagination_ordering(self):
+        """Page search results by relevance, everything else newest first"""
+        if self.request.query_params.get('search'):
+            return ('-search_rank', '-id')
+        return None
+
+    def get_validator_aggregates(self):
+        """Return the aggregates the conditional GET validator is built of"""
+        aggregates = super().get_validator_aggregates()
+        if self.action == 'retrieve':
+            # the detail embeds the tags and ingredients so renaming or
+            # deleting one of them changes the response too
+            fields = self.get_sparse_fields()
+            for name in ('tags', 'ingredients'):
+                if fields is None or name in fields:
+                    aggregates.update({
+                        f'{name}_last_modified': Max(f'{name}__updated_at'),
+                        f'{name}_count': Count(name, distinct=True),
+                    })
+        return aggregates
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return a recipe detail, from the response cache if possible"""
+        return self.read_response(
+            super().retrieve, request, *args, **kwargs)
 
     # overwrite serializer class for retrieve
     # will return a different serializer
@@ -54,7 +223,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return serializers.RecipeDetailSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'upload_image_part'):
             return serializers.RecipeImageSerializer
 
         return self.serializer_class
@@ -69,16 +238,104 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Upload an image to a recipe"""
         # get object based on the id in the URL and then we'll call serializer
         recipe = self.get_object()
+        # write the file to the media directory as it arrives instead of
+        # buffering it in memory or a temporary file first
+        request.upload_handlers[:] = [StreamingImageUploadHandler(request)]
         # could hard code RecipeImageSerializer but it's best practice to use get_serializer
         # which uses the get_serializer_class
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
             serializer.save()
+            # the original is stored, the smaller sizes follow in the
+            # background
+            schedule_derivatives(recipe.image.name)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @upload_image.mapping.put
+    def upload_image_part(self, request, pk=None):
+        """Receive an image in pieces, Content-Range: bytes start-end/total
+
+        Content-Range: bytes */total asks for the offset to resume from.
+        """
+        recipe = self.get_object()
+        match = CONTENT_RANGE_RE.match(
+            request.META.get('HTTP_CONTENT_RANGE', ''))
+        if match is None:
+            return Response(
+                {'detail': 'Expected Content-Range: bytes start-end/total'},
+                status=status.HTTP_400_BAD_REQUEST)
+        start, end, total = (
+            int(value) if value else None for value in match.groups())
+        if start is not None and not start <= end < total:
+            return Response({'detail': 'Invalid Content-Range'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        upload = ResumableUpload(recipe)
+        if start is None:
+            return Response({'offset': upload.offset})
+        # a piece starting at 0 begins the upload again
+        if start == 0:
+            upload.discard()
+        if start != upload.offset:
+            return Response({'offset': upload.offset},
+                            status=status.HTTP_409_CONFLICT)
+
+        try:
+            offset = upload.append(request.stream, start, end, total)
+        except ImageRejected as exc:
+            upload.discard()
+            return Response({'image': [str(exc)]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if offset < total:
+            return Response({'offset': offset},
+                            status=status.HTTP_202_ACCEPTED)
+
+        serializer = self.get_serializer(
+            recipe, data={'image': upload.uploaded_file()})
+        if not serializer.is_valid():
+            upload.discard()
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+        schedule_derivatives(recipe.image.name)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create or update a list of recipes in one transaction"""
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non empty list of recipes'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'detail': f'At most {self.bulk_max_items} recipes at once'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        validated, errors = validate_recipe_batch(request.user, items)
+        # all or nothing, report what is wrong with each item
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = save_recipe_batch(request.user, validated)
+        return Response(
+            [{'id': recipe_id,
+              'status': 'updated' if 'id' in data else 'created'}
+             for recipe_id, data in zip(ids, validated)],
+            status=status.HTTP_201_CREATED)
+
+
+class ResponseCacheStatsView(APIView):
+    """Show the response cache counters of this process"""
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        return Response(get_response_cache().stats())
+
 
 # can use a different viewset instead of mixin as well
 # class TagViewSet(viewsets.GenericViewSet, mixins.ListModelMixin,
@@ -0,0 +1,105 @@
+import hashlib
+import pickle
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models import Token
+
+
+class TokenCache:
+    """Cache of the user each API token belongs to
+
+    Keys are a hash of the token so a shared backend never holds usable
+    tokens. Entries are dropped when the token or its user changes (see
+    user.signals) and expire after TIMEOUT seconds anyway, which bounds
+    how long another process with its own LocMemBackend may still accept
+    a revoked token.
+    """
+
+    def __init__(self, backend, timeout=60):
+        self.backend = backend
+        self.timeout = timeout
+
+    def key(self, token_key):
+        return 'token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+    def get(self, token_key):
+        """Return the cached (user, token) of a token key or None"""
+        value = self.backend.get(self.key(token_key))
+        # pickled even in process, so requests never share a user instance
+        return None if value is None else pickle.loads(value)
+
+    def set(self, token_key, user, token):
+        self.backend.set(
+            self.key(token_key),
+            pickle.dumps((user, token), pickle.HIGHEST_PROTOCOL),
+            self.timeout)
+
+    def delete(self, token_key):
+        self.backend.delete(self.key(token_key))
+
+    def clear(self):
+        self.backend.clear()
+
+
+_token_cache = None
+
+
+def get_token_cache():
+    """Return the token cache configured in TOKEN_AUTH_CACHE"""
+    global _token_cache
+    if _token_cache is None:
+        options = settings.TOKEN_AUTH_CACHE
+        backend = import_string(options['BACKEND'])(options)
+        _token_cache = TokenCache(backend, timeout=options.get('TIMEOUT', 60))
+    return _token_cache
+
+
+@receiver(setting_changed)
+def reset_token_cache(setting, **kwargs):
+    """Rebuild the cache when tests override its settings"""
+    global _token_cache
+    if setting == 'TOKEN_AUTH_CACHE':
+        _token_cache = None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication of expiring tokens, looked up in the token cache
+    first"""
+    model = Token
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            user, token = cached
+        else:
+            # raises AuthenticationFailed for unknown tokens and inactive
+            # users, neither is cached so they are checked again next time
+            user, token = super().authenticate_credentials(key)
+
+        now = timezone.now()
+        if token.is_expired(now):
+            cache.delete(key)
+            raise AuthenticationFailed(_('Token has expired.'))
+
+        interval = timedelta(
+            seconds=settings.TOKEN_EXPIRY['REFRESH_INTERVAL'])
+        if token.last_used < now - interval:
+            # slides the expiry, the condition makes concurrent requests and
+            # processes write it once per interval
+            Token.objects.filter(key=key, last_used__lt=now - interval) \
+                .update(last_used=now)
+            token.last_used = now
+            cached = None
+        if cached is None:
+            cache.set(key, user, token)
+        return user, token
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from core.hashing import hash_password, verify_password
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend checking passwords in the hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # hash anyway so response times do not tell which emails exist
+            hash_password(password)
+            return None
+
+        # the lookup and the save stay in the request thread, only the
+        # hashing moves to the pool
+        valid, outdated = verify_password(password, user.password)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if outdated:
+            user.set_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,72 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from user.views import CreateTokenView
+
+
+class Command(BaseCommand):
+    """Django command to measure logins per second"""
+    help = 'Log in concurrently with and without the password hashing pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='login-bench@londonappdev.com')
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--max-queue', type=int, default=16)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        password = 'benchpass'
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            user = get_user_model().objects.create_user(
+                options['email'], password)
+        self.payload = {'email': options['email'], 'password': password}
+
+        cases = [
+            ('request thread', {'WORKERS': 0}),
+            (f'pool of {options["workers"]}', {
+                'WORKERS': options['workers'],
+                'MAX_QUEUE': options['max_queue'],
+                'TIMEOUT': 10,
+            }),
+        ]
+        for name, hashing in cases:
+            with override_settings(PASSWORD_HASHING=hashing):
+                # warm up, the first login may rehash the stored password
+                self.login()
+                start = time.perf_counter()
+                with ThreadPoolExecutor(options['concurrency']) as executor:
+                    results = list(executor.map(
+                        lambda _: self.login(), range(options['logins'])))
+                duration = time.perf_counter() - start
+
+            statuses = Counter(status for status, _ in results)
+            self.stdout.write(
+                f'{name:<16} {statuses[200] / duration:7.1f} logins/s, '
+                f'median 200 {self.median(results, 200):7.1f}ms, '
+                f'median 429 {self.median(results, 429):7.1f}ms, '
+                f'statuses {dict(statuses)}')
+
+    def login(self):
+        request = APIRequestFactory().post(
+            '/api/user/token/', self.payload, format='json')
+        start = time.perf_counter()
+        try:
+            response = CreateTokenView.as_view()(request)
+        finally:
+            connections.close_all()
+        return response.status_code, time.perf_counter() - start
+
+    def median(self, results, status):
+        durations = sorted(elapsed for code, elapsed in results
+                           if code == status)
+        return durations[len(durations) // 2] * 1000 if durations else 0
@@ -0,0 +1,49 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.test import APIRequestFactory
+
+from core.models import Token
+from user.authentication import CachedTokenAuthentication, get_token_cache
+
+
+class UncachedTokenAuthentication(TokenAuthentication):
+    model = Token
+
+
+class Command(BaseCommand):
+    """Django command to compare token authentication with and without the
+    token cache"""
+    help = 'Count queries and time per request of the token authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', default='bench@londonappdev.com')
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user = get_user_model().objects.filter(email=options['email']).first()
+        if user is None:
+            user = get_user_model().objects.create_user(
+                options['email'], 'benchpass')
+        token = Token.objects.issue(user)
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        get_token_cache().clear()
+
+        for authentication in (UncachedTokenAuthentication,
+                               CachedTokenAuthentication):
+            authenticator = authentication()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    authenticator.authenticate(request)
+                duration = time.perf_counter() - start
+            self.stdout.write(
+                f'{authentication.__name__:<28} '
+                f'{len(queries) / options["requests"]:6.3f} queries and '
+                f'{duration / options["requests"] * 1e6:8.1f}us per request')
@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db.models.functions import Lower
+
+from core.models import Token
+from core.sharding import mirror_users
+
+
+def hash_passwords(passwords):
+    """Return the hashes of passwords, runs in a worker process"""
+    return [make_password(password) for password in passwords]
+
+
+class Command(BaseCommand):
+    """Django command to create many users from a CSV or NDJSON file"""
+    help = ('Create users from a file with email, password and name '
+            'columns, reporting the rows that could not be created')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file, - for stdin')
+        parser.add_argument('--format', choices=('csv', 'ndjson'),
+                            help='Defaults to the extension of path')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users inserted per query')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes hashing passwords, 0 hashes '
+                                 'in this process')
+        parser.add_argument('--tokens',
+                            help='Issue a token to every created user and '
+                                 'write email,token lines to this file')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        file_format = options['format'] or (
+            'ndjson' if options['path'].endswith(('.ndjson', '.jsonl'))
+            else 'csv')
+        try:
+            source = sys.stdin if options['path'] == '-' else \
+                open(options['path'], newline='')
+        except OSError as error:
+            raise CommandError(error)
+        self.workers = options['workers']
+        self.executor = ProcessPoolExecutor(self.workers) \
+            if self.workers else None
+        tokens = open(options['tokens'], 'w', newline='') \
+            if options['tokens'] else None
+
+        created = failed = 0
+        try:
+            rows = self.read_csv(source) if file_format == 'csv' else \
+                self.read_ndjson(source)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                users, errors = self.create_batch(batch)
+                # bulk_create skips the post_save copying users to shards
+                mirror_users(users)
+                created += len(users)
+                failed += len(errors)
+                for line, email, error in sorted(errors):
+                    self.stderr.write(f'line {line}: {email}: {error}')
+                if tokens is not None:
+                    self.issue_tokens(users, csv.writer(tokens))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if tokens is not None:
+                tokens.close()
+            if self.executor is not None:
+                self.executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} users, {failed} rows failed'))
+
+    def read_csv(self, source):
+        """Yield (line, row) of a CSV file with a header line"""
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            yield line, row
+
+    def read_ndjson(self, source):
+        """Yield (line, row) of a file of one JSON object per line"""
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError:
+                row = None
+            yield line, row if isinstance(row, dict) else {}
+
+    def create_batch(self, batch):
+        """Insert the valid rows of batch
+
+        Returns the created users and (line, email, error) of the others.
+        """
+        User = get_user_model()
+        errors = []
+        rows = {}
+        for line, row in batch:
+            email = User.objects.normalize_email(
+                (row.get('email') or '').strip())
+            try:
+                validate_email(email)
+            except ValidationError:
+                errors.append((line, email, 'invalid email'))
+                continue
+            # emails are unique ignoring case, see UserManager.filter_email
+            if email.lower() in rows:
+                errors.append((line, email, 'duplicate email in file'))
+                continue
+            rows[email.lower()] = (line, email, row)
+
+        for email in self.existing(rows):
+            line, email, _ = rows.pop(email)
+            errors.append((line, email, 'already exists'))
+        if not rows:
+            return [], errors
+
+        # a missing password makes an unusable one, like create_user(None)
+        passwords = [row.get('password') or None
+                     for _, _, row in rows.values()]
+        if self.executor is None:
+            hashes = hash_passwords(passwords)
+        else:
+            # one slice of the batch per process
+            size = -(-len(passwords) // self.workers)
+            slices = [passwords[start:start + size]
+                      for start in range(0, len(passwords), size)]
+            hashes = [encoded for part in
+                      self.executor.map(hash_passwords, slices)
+                      for encoded in part]
+
+        users = [
+            User(email=email, password=encoded, name=row.get('name') or '')
+            for (_, email, row), encoded in zip(rows.values(), hashes)
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        # rows someone else inserted meanwhile were skipped, they are the
+        # ones whose stored hash is not ours
+        stored = {email: (pk, encoded) for email, pk, encoded in
+                  User.objects.annotate(email_lower=Lower('email'))
+                  .filter(email_lower__in=list(rows))
+                  .values_list('email_lower', 'pk', 'password')}
+        created = []
+        for user in users:
+            pk, encoded = stored.get(user.email.lower(), (None, None))
+            if encoded == user.password:
+                user.pk = pk
+                created.append(user)
+            else:
+                errors.append((rows[user.email.lower()][0], user.email,
+                               'already exists'))
+        return created, errors
+
+    def existing(self, rows):
+        """Return the lower cased emails of rows that are registered"""
+        return list(get_user_model().objects
+                    .annotate(email_lower=Lower('email'))
+                    .filter(email_lower__in=list(rows))
+                    .values_list('email_lower', flat=True))
+
+    def issue_tokens(self, users, writer):
+        """Create a token for each user and write email,token"""
+        tokens = [Token(key=Token.generate_key(), user_id=user.pk)
+                  for user in users]
+        Token.objects.bulk_create(tokens)
+        for user, token in zip(users, tokens):
+            writer.writerow([user.email, token.key])
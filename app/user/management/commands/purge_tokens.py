@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Token
+
+
+class Command(BaseCommand):
+    """Django command to delete expired API tokens"""
+    help = 'Delete expired tokens a batch at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Tokens deleted per transaction')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        deleted = 0
+        while True:
+            # short transactions over the primary key, so logins and
+            # requests using other tokens never wait long on the locks
+            with transaction.atomic():
+                keys = list(Token.objects.expired()
+                            .values_list('pk', flat=True)
+                            [:options['batch_size']])
+                if keys:
+                    Token.objects.filter(pk__in=keys).delete()
+            deleted += len(keys)
+            if len(keys) < options['batch_size']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} expired tokens'))
@@ -16,6 +16,16 @@ class UserSerializer(serializers.ModelSerializer):
         # extra_kwargs for extra settings for fields
         extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
 
+    def validate_email(self, value):
+        """Reject emails registered in another case"""
+        users = get_user_model().objects.filter_email(value)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError(
+                _('user with this email already exists.'))
+        return value
+
     # from DRF documentation and what you can overrides in serializers
     def create(self, validated_data):
         """Create a new user with encrypted password and return it"""
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Token
+from user.authentication import get_token_cache
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance, **kwargs):
+    """Drop a deleted or replaced token from the token cache"""
+    get_token_cache().delete(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def forget_user_tokens(sender, instance, created, **kwargs):
+    """Drop the tokens of a changed user, deactivated users must not
+    keep authenticating from the cache"""
+    if created:
+        return
+    cache = get_token_cache()
+    for key in Token.objects.filter(user=instance) \
+            .values_list('key', flat=True):
+        cache.delete(key)
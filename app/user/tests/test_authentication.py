@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from core.models import Token
+from user.authentication import CachedTokenAuthentication, get_token_cache
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+        self.token = Token.objects.create(user=self.user)
+        self.authenticator = CachedTokenAuthentication()
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {key or self.token.key}')
+        return self.authenticator.authenticate(request)
+
+    def test_lookup_cached(self):
+        """Test only the first request queries the database"""
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating"""
+        self.authenticate()
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_rotated_token_rejected(self):
+        """Test only the replacing token authenticates after rotation"""
+        self.authenticate()
+        self.token.delete()
+        token = Token.objects.create(user=self.user)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+        user, _ = self.authenticate(token.key)
+        self.assertEqual(user, self.user)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user stops authenticating"""
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_expired_token_rejected(self):
+        """Test a token unused for too long stops authenticating"""
+        self.authenticate()
+        Token.objects.update(last_used=timezone.now() - timedelta(days=15))
+        get_token_cache().clear()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_last_used_written_once_per_interval(self):
+        """Test use slides the expiry without writing on every request"""
+        last_used = timezone.now() - timedelta(minutes=10)
+        Token.objects.update(last_used=last_used)
+
+        # the lookup and the refresh
+        with self.assertNumQueries(2):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.last_used, last_used)
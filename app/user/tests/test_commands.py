@@ -0,0 +1,97 @@
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Token
+
+
+class PurgeTokensTests(TestCase):
+    """Test deleting expired tokens"""
+
+    def test_purge_expired_tokens(self):
+        """Test only expired tokens are deleted, in batches"""
+        now = timezone.now()
+        for index in range(5):
+            user = get_user_model().objects.create_user(
+                f'test{index}@londonappdev.com', 'testpass')
+            Token.objects.create(user=user)
+        Token.objects.filter(user__email__in=[
+            'test0@londonappdev.com', 'test1@londonappdev.com',
+        ]).update(last_used=now - timedelta(days=15))
+        Token.objects.filter(user__email='test2@londonappdev.com') \
+            .update(created=now - timedelta(days=91))
+
+        out = StringIO()
+        call_command('purge_tokens', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(Token.objects.count(), 2)
+        self.assertIn('Deleted 3 expired tokens', out.getvalue())
+
+
+class ProvisionUsersTests(TestCase):
+    """Test creating users from a file"""
+
+    def write(self, content, suffix='.csv'):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, delete=False)
+        self.addCleanup(os.remove, file.name)
+        with file:
+            file.write(content)
+        return file.name
+
+    def call(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('provision_users', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_create_users_from_csv(self):
+        """Test users are created with hashed passwords"""
+        path = self.write('email,password,name\n'
+                          'one@londonappdev.com,testpass,One\n'
+                          'two@londonappdev.com,testpass,Two\n')
+
+        out, err = self.call(path, '--workers', '1')
+
+        user = get_user_model().objects.get(email='one@londonappdev.com')
+        self.assertEqual(user.name, 'One')
+        self.assertTrue(user.check_password('testpass'))
+        self.assertEqual(get_user_model().objects.count(), 2)
+        self.assertIn('Created 2 users, 0 rows failed', out)
+        self.assertEqual(err, '')
+
+    def test_conflicts_reported(self):
+        """Test existing, repeated and invalid emails are reported by line"""
+        get_user_model().objects.create_user(
+            'One@londonappdev.com', 'testpass')
+        path = self.write(
+            '{"email": "one@londonappdev.com", "password": "testpass"}\n'
+            '{"email": "two@londonappdev.com", "password": "testpass"}\n'
+            '{"email": "TWO@londonappdev.com", "password": "testpass"}\n'
+            '{"email": "not an email"}\n', suffix='.ndjson')
+
+        out, err = self.call(path, '--workers', '0', '--batch-size', '2')
+
+        self.assertEqual(err.splitlines(), [
+            'line 1: one@londonappdev.com: already exists',
+            'line 3: TWO@londonappdev.com: already exists',
+            'line 4: not an email: invalid email',
+        ])
+        self.assertIn('Created 1 users, 3 rows failed', out)
+
+    def test_issue_tokens(self):
+        """Test a token is issued to every created user"""
+        path = self.write('email,password\none@londonappdev.com,testpass\n')
+        tokens = self.write('')
+
+        self.call(path, '--workers', '0', '--tokens', tokens)
+
+        token = Token.objects.get(user__email='one@londonappdev.com')
+        with open(tokens) as file:
+            self.assertEqual(file.read().strip(),
+                             f'one@londonappdev.com,{token.key}')
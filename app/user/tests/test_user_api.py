@@ -1,14 +1,20 @@
+from datetime import timedelta
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 # make it more human readable
 from rest_framework import status
 
+from core.models import Token
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+ROTATE_TOKEN_URL = reverse('user:token-rotate')
 
 
 # dynamic list of arguments of keys and values
@@ -58,6 +64,17 @@ class PublicUserApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_user_exists_in_other_case(self):
+        """Test an email registered in another case is rejected"""
+        create_user(email='Klay@warriors.com', password='3ptsandD')
+        res = self.client.post(CREATE_USER_URL, {
+            'email': 'klay@warriors.com',
+            'password': '3ptsandD',
+            'name': 'Klay Thompson',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_password_too_short(self):
         """Test that password must be more than 5 characters"""
         # every test refreshes new test database
@@ -87,6 +104,44 @@ class PublicUserApiTests(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_email_case_insensitive(self):
+        """Test logging in with the email in another case"""
+        create_user(email='Test@londonappdev.com', password='testpass')
+        res = self.client.post(TOKEN_URL, {
+            'email': 'test@LondonAppDev.com', 'password': 'testpass'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+
+    def test_create_token_reused_until_expired(self):
+        """Test logging in again returns the same token until it expires"""
+        payload = {'email': 'test@londonappdev.com', 'password': 'testpass'}
+        create_user(**payload)
+        first = self.client.post(TOKEN_URL, payload).data['token']
+
+        self.assertEqual(self.client.post(TOKEN_URL, payload).data['token'],
+                         first)
+        Token.objects.update(created=timezone.now() - timedelta(days=91))
+        self.assertNotEqual(
+            self.client.post(TOKEN_URL, payload).data['token'], first)
+
+    def test_rotate_token(self):
+        """Test rotating replaces the token of the request"""
+        user = create_user(email='test@londonappdev.com', password='testpass')
+        old = Token.objects.create(user=user)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {old.key}')
+        res = self.client.post(ROTATE_TOKEN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Token.objects.filter(pk=old.pk).exists())
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {res.data["token"]}')
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
     def test_create_token_invalid_credentials(self):
         """Test that token is not created if invalid credentials are given"""
         create_user(email='test@londonappdev.com', password='testpass')
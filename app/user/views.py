@@ -1,6 +1,13 @@
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from core.models import Token
+from core.routers import ReplicaReadMixin
+from user.authentication import CachedTokenAuthentication
 from user.serializers import AuthTokenSerializer, UserSerializer
 
 
@@ -19,13 +26,34 @@ class CreateTokenView(ObtainAuthToken):
     # this let's you see this endpoint for renderer class for ObtainAuthToken
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        # logging in again reuses the token until it expires
+        token = Token.objects.issue(serializer.validated_data['user'])
+        return Response({'token': token.key})
+
+
+class RotateTokenView(APIView):
+    """Replace the token of the request with a new one"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        with transaction.atomic():
+            Token.objects.filter(pk=request.auth.pk).delete()
+            token = Token.objects.create(user=request.user)
+        return Response({'token': token.key}, status=status.HTTP_201_CREATED)
+
+
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     # this is overriding the getting of a model
     def get_object(self):
         """Retrieve and return authenticated user"""
-        return self.request.user
\ No newline at end of file
+        return self.request.user